@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark: deep-dive searches against the local stand-in
+server (standin.py) instead of live DDG / Google and article sites.
+
+Starts the stand-in, points DDGLiteProvider, GoogleCustomSearchProvider and
+the result links at it, runs --queries searches per pass in a throwaway
+cache directory and reports throughput, p50/p95 search latency, CPU per
+page and peak memory. Politeness delays and the DDG rate limit are turned
+off so the numbers reflect the code, not the pacing. With --cache, later
+passes show the effect of the result and page caches.
+
+Usage:
+    python bench/bench_offline.py [--queries 20] [--count 10] [--concurrency 4] [--provider ddg]
+                                  [--passes 1] [--cache] [--latency-ms 50] [--error-rate 0.02]
+                                  [--challenge-rate 0] [--sizes 20,100,500] [--corpus DIR]
+"""
+import argparse
+import contextlib
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH, ".."))
+
+import evo_search
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def start_standin(args):
+    cmd = [sys.executable, os.path.join(BENCH, "standin.py"),
+           "--latency-ms", str(args.latency_ms), "--error-rate", str(args.error_rate),
+           "--challenge-rate", str(args.challenge_rate), "--sizes", args.sizes]
+    if args.corpus:
+        cmd += ["--corpus", args.corpus]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    port = int(proc.stdout.readline())
+    return proc, f"http://127.0.0.1:{port}"
+
+def make_context():
+    ctx = evo_search.SearchContext()
+    ctx.throttle = evo_search.HostThrottle(jitter=(0, 0))
+    # A private, effectively unlimited bucket; challenges still trip the breaker
+    ctx.ddg.limiter = evo_search.AdaptiveRateLimiter("bench", rate=1e6, min_rate=1e6, max_rate=1e6, burst=1e6)
+    return ctx
+
+def run_pass(args, ctx, parser):
+    latencies = []
+    pages = failed_pages = failed_searches = 0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for i in range(args.queries):
+        argv = [f"bench query {i}", "--deep", "-c", str(args.count), "--provider", args.provider,
+                "--concurrency", str(args.concurrency)]
+        if not args.cache:
+            argv.append("--no-cache")
+        query_args = parser.parse_args(argv)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stderr(io.StringIO()):
+            output = evo_search.run_search(query_args, ctx)
+        latencies.append(time.perf_counter() - start)
+
+        if output.get("error"):
+            failed_searches += 1
+        for res in output.get("results", []):
+            if res.get("deep_dive_status") == "success":
+                pages += 1
+            else:
+                failed_pages += 1
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return {
+        "wall": wall,
+        "pages": pages,
+        "failed_pages": failed_pages,
+        "failed_searches": failed_searches,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "cpu_per_page": cpu / pages if pages else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end search benchmark")
+    parser.add_argument("--queries", type=int, default=20, help="Searches per pass")
+    parser.add_argument("--count", type=int, default=10, help="Results (and deep dives) per search")
+    parser.add_argument("--concurrency", type=int, default=evo_search.DEEP_DIVE_CONCURRENCY, help="Parallel deep dive fetches")
+    parser.add_argument("--provider", choices=["ddg", "google"], default="ddg", help="Stand-in provider to search")
+    parser.add_argument("--passes", type=int, default=1, help="Runs of the same query set")
+    parser.add_argument("--cache", action="store_true", help="Keep result and page caches on (fresh for the first pass)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mean stand-in latency per response")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Share of stand-in responses that are HTTP 500")
+    parser.add_argument("--challenge-rate", type=float, default=0.0, help="Share of DDG pages that are bot challenges")
+    parser.add_argument("--sizes", default="20,100,500", help="Synthetic article sizes in KB")
+    parser.add_argument("--corpus", metavar="DIR", help="Recorded article HTML files to serve instead")
+    args = parser.parse_args()
+
+    proc, base = start_standin(args)
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            evo_search.DDGLiteProvider.url = f"{base}/lite/"
+            evo_search.GoogleCustomSearchProvider.url = f"{base}/customsearch/v1"
+            os.environ["GOOGLE_API_KEY"] = os.environ["GOOGLE_CX"] = "bench"
+            ctx = make_context()
+            search_parser = evo_search.build_parser()
+
+            print(f"{args.queries} searches x {args.count} deep dives, provider {args.provider}, "
+                  f"concurrency {args.concurrency}, cache {'on' if args.cache else 'off'}, latency {args.latency_ms:.0f} ms")
+            print(f"{'pass':<6}{'pages':>7}{'failed':>8}{'wall s':>9}{'pages/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'cpu ms/page':>13}")
+            for number in range(1, args.passes + 1):
+                stats = run_pass(args, ctx, search_parser)
+                throughput = stats["pages"] / stats["wall"] if stats["wall"] else 0.0
+                print(f"{number:<6}{stats['pages']:>7}{stats['failed_pages'] + stats['failed_searches']:>8}"
+                      f"{stats['wall']:>9.2f}{throughput:>9.1f}{stats['p50'] * 1000:>9.0f}{stats['p95'] * 1000:>9.0f}"
+                      f"{stats['cpu_per_page'] * 1000:>13.1f}")
+            os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+        proc.terminate()
+        proc.wait()
+
+    # ru_maxrss is in KB on Linux
+    print(f"peak memory: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+if __name__ == "__main__":
+    main()
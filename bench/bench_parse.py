@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-page extraction cost of the single-parse pipeline
+(evo_search.extract_page) against the legacy path, which parsed each page
+with BeautifulSoup twice and then once more (per call) inside readability.
+The pipeline is pinned to its readability tier (tiered=False), so both
+columns do the same work, and both must return the same fields.
+
+Usage:
+    python bench/bench_parse.py [--sizes 20,100,500] [--repeat 5] [FILE.html ...]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import html2text
+from bs4 import BeautifulSoup
+from dateutil import parser as date_parser
+from readability import Document
+
+import evo_search
+from pages import make_article
+
+def legacy_extract_date(html_content, url=""):
+    """The pre-pipeline extract_date_from_html, kept verbatim for comparison."""
+    try:
+        soup = BeautifulSoup(html_content, 'lxml')
+        
+        # 1. JSON-LD
+        for script in soup.find_all('script', type='application/ld+json'):
+            try:
+                data = json.loads(script.string)
+                if isinstance(data, list): data = data[0]
+                date_str = data.get('datePublished') or data.get('dateCreated') or data.get('uploadDate')
+                if date_str:
+                    return date_parser.parse(date_str)
+            except:
+                continue
+
+        # 2. Meta Tags
+        meta_targets = [
+            {'property': 'article:published_time'},
+            {'name': 'date'},
+            {'name': 'pubdate'},
+            {'name': 'original-publish-date'},
+            {'name': 'publication_date'},
+            {'property': 'og:published_time'},
+            {'name': 'DC.date.issued'},
+            {'name': 'citation_date'}
+        ]
+        
+        for attrs in meta_targets:
+            tag = soup.find('meta', attrs)
+            if tag and tag.get('content'):
+                try:
+                    return date_parser.parse(tag['content'])
+                except:
+                    continue
+
+        # 3. URL Regex (e.g., /2023/10/25/...)
+        url_date = re.search(r'/(\d{4})/(\d{2})/(\d{2})/', url)
+        if url_date:
+            try:
+                return datetime(int(url_date.group(1)), int(url_date.group(2)), int(url_date.group(3)))
+            except:
+                pass
+
+        # 4. Visible Time tag
+        time_tag = soup.find('time')
+        if time_tag and time_tag.get('datetime'):
+             try:
+                return date_parser.parse(time_tag['datetime'])
+             except:
+                pass
+
+    except Exception as e:
+        pass
+    
+    return None
+
+def legacy_extract(html_content, url="", extract_media=True):
+    """
+    The pre-pipeline process_deep_dive body after the download, kept
+    verbatim for comparison. Returns extract_page's fields.
+    """
+    soup = BeautifulSoup(html_content, 'lxml')
+    
+    # Extract Metadata
+    pub_date = legacy_extract_date(html_content, url)
+    
+    # Media Extraction
+    image_url = None
+    video_urls = []
+    
+    if extract_media:
+        # 1. Image
+        og_image = soup.find('meta', attrs={'property': 'og:image'})
+        twitter_image = soup.find('meta', attrs={'name': 'twitter:image'})
+        if og_image and og_image.get('content'):
+            image_url = og_image['content']
+        elif twitter_image and twitter_image.get('content'):
+            image_url = twitter_image['content']
+            
+        # 2. Videos (iframes)
+        # Basic check for youtube/vimeo in src
+        for iframe in soup.find_all('iframe'):
+            src = iframe.get('src', '')
+            if 'youtube.com' in src or 'youtu.be' in src or 'vimeo.com' in src:
+                video_urls.append(src)
+    
+    # Readability extraction
+    doc = Document(html_content)
+    title = doc.title()
+    summary_html = doc.summary()
+    
+    # HTML to Markdown
+    h = html2text.HTML2Text()
+    h.ignore_links = False
+    h.ignore_images = True
+    h.body_width = 0 # No wrapping
+    markdown = h.handle(summary_html)
+    
+    return {
+        "full_content": markdown,
+        "extracted_date": pub_date.isoformat() if pub_date else None,
+        "extracted_title": title,
+        "image_url": image_url,
+        "video_urls": video_urls
+    }
+
+def differences(legacy, pipeline):
+    """Fields on which the two extractions disagree."""
+    return [field for field in legacy if legacy[field] != pipeline[field]]
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-parse extraction microbenchmark")
+    parser.add_argument("files", nargs="*", help="Recorded HTML pages (default: synthetic pages)")
+    parser.add_argument("--sizes", default="20,100,500", help="Synthetic page sizes in KB")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per page (best is kept)")
+    args = parser.parse_args()
+
+    pages = []
+    for path in args.files:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages.append((os.path.basename(path), f.read()))
+    if not pages:
+        for i, size in enumerate(int(s) for s in args.sizes.split(",")):
+            pages.append((f"synthetic-{size}KB", make_article(i, size)))
+
+    failed = False
+    print(f"{'page':<24}{'bytes':>10}{'legacy ms':>12}{'pipeline ms':>13}{'saved':>8}  same")
+    for name, html_content in pages:
+        differ = differences(legacy_extract(html_content),
+                             evo_search.extract_page(html_content, extract_media=True, tiered=False))
+        failed = failed or bool(differ)
+
+        legacy = best_of(lambda: legacy_extract(html_content), args.repeat)
+        pipeline = best_of(lambda: evo_search.extract_page(html_content, extract_media=True, tiered=False), args.repeat)
+        saved = 1 - pipeline / legacy if legacy else 0
+        print(f"{name:<24}{len(html_content):>10}{legacy * 1000:>12.1f}{pipeline * 1000:>13.1f}{saved:>8.0%}"
+              f"  {'NO: ' + ', '.join(differ) if differ else 'yes'}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
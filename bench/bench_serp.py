@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: DDG Lite results-page parsing, BeautifulSoup/lxml
+(DDGLiteProvider.parse_results) against the --fast regex parser
+(DDGLiteProvider.parse_results_fast). Also checks that both return the
+same results and next-page payload.
+
+Record pages with e.g.
+    curl -s -A 'Mozilla/5.0' -d 'q=python' https://lite.duckduckgo.com/lite/ > python.html
+
+Usage:
+    python bench/bench_serp.py [--repeat 20] [FILE.html ...]
+"""
+import argparse
+import os
+import sys
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH, ".."))
+
+import evo_search
+from standin import lite_page
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="DDG Lite results parser microbenchmark")
+    parser.add_argument("files", nargs="*", help="Recorded DDG Lite result pages (default: stand-in pages)")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per page (best is kept)")
+    args = parser.parse_args()
+
+    pages = []
+    for path in args.files:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages.append((os.path.basename(path), f.read()))
+    if not pages:
+        for start in (0, 40):
+            pages.append((f"standin-s{start}", lite_page("https://example.com", "bench query", start)))
+
+    failed = False
+    print(f"{'page':<24}{'bytes':>10}{'results':>9}{'soup ms':>10}{'fast ms':>10}{'saved':>8}  same")
+    for name, output in pages:
+        soup_parsed = evo_search.DDGLiteProvider.parse_results(output)
+        fast_parsed = evo_search.DDGLiteProvider.parse_results_fast(output)
+        same = soup_parsed == fast_parsed
+        failed = failed or not same
+
+        soup = best_of(lambda: evo_search.DDGLiteProvider.parse_results(output), args.repeat)
+        fast = best_of(lambda: evo_search.DDGLiteProvider.parse_results_fast(output), args.repeat)
+        saved = 1 - fast / soup if soup else 0
+        print(f"{name:<24}{len(output):>10}{len(soup_parsed[0]):>9}{soup * 1000:>10.2f}{fast * 1000:>10.2f}"
+              f"{saved:>8.0%}  {'yes' if same else 'NO'}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the cache-hit path.
+
+Primes a throwaway cache, then times `python -X importtime search.py QUERY`
+against a bare interpreter start. Fails (exit 1) if a cache hit imports any
+heavy dependency or its overhead exceeds the budget. search.py is only the
+entry point: Python keeps no bytecode for the script it runs, so the
+implementation lives in evo_search.py, whose bytecode is cached on import.
+
+Usage:
+    python bench/bench_startup.py [--runs 15] [--budget-ms 60]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SEARCH = os.path.join(ROOT, "search.py")
+sys.path.insert(0, ROOT)
+
+# Must never be imported to answer a cached query
+HEAVY_MODULES = ("requests", "urllib3", "bs4", "lxml", "readability", "html2text", "dateutil", "concurrent.futures")
+
+QUERY = "evo search startup benchmark"
+
+def prime_cache(workdir):
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import evo_search
+        args = evo_search.build_parser().parse_args([QUERY])
+        output = {
+            "query": QUERY,
+            "count": 1,
+            "provider": "DDGLiteProvider",
+            "results": [{"title": "Cached", "url": "https://example.com/", "deep_dive_status": "skipped"}]
+        }
+        evo_search.store_cached_result(evo_search.get_cache_key(QUERY, args), output, QUERY, args)
+    finally:
+        os.chdir(cwd)
+
+def timed_run(cmd, workdir):
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=workdir, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} failed:\n{proc.stderr}")
+    return elapsed, proc
+
+def imported_modules(importtime_stderr):
+    modules = set()
+    for line in importtime_stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache-hit startup benchmark")
+    parser.add_argument("--runs", type=int, default=15, help="Timed runs (median is kept)")
+    parser.add_argument("--budget-ms", type=float, default=60.0, help="Allowed overhead over a bare interpreter start")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        prime_cache(workdir)
+
+        cached_cmd = [sys.executable, "-X", "importtime", SEARCH, QUERY]
+        bare_cmd = [sys.executable, "-X", "importtime", "-c", "pass"]
+
+        _, proc = timed_run(cached_cmd, workdir)
+        if '"cached": true' not in proc.stdout:
+            print("FAIL: primed query was not served from cache")
+            return 1
+        loaded = imported_modules(proc.stderr)
+        heavy = [m for m in HEAVY_MODULES if m in loaded]
+
+        bare = statistics.median(timed_run(bare_cmd, workdir)[0] for _ in range(args.runs))
+        cached = statistics.median(timed_run(cached_cmd, workdir)[0] for _ in range(args.runs))
+
+    overhead_ms = (cached - bare) * 1000
+    print(f"bare interpreter: {bare * 1000:.1f} ms")
+    print(f"cache hit:        {cached * 1000:.1f} ms (overhead {overhead_ms:.1f} ms, budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if heavy:
+        print(f"FAIL: cache hit imported heavy modules: {', '.join(heavy)}")
+        failed = True
+    if overhead_ms > args.budget_ms:
+        print("FAIL: cache-hit startup over budget")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
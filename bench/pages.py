@@ -0,0 +1,50 @@
+"""
+Synthetic page generator shared by the benchmarks.
+
+Pages mimic a news article: a heavy <head> (meta tags, JSON-LD, inline
+scripts/styles), navigation chrome, the article body and a long footer of
+related links. Output is deterministic for a given (index, size).
+"""
+import random
+
+WORDS = (
+    "the government announced new measures on monday as markets reacted to "
+    "reports that officials had been negotiating for weeks over the terms of "
+    "an agreement analysts said could reshape energy prices across the region "
+    "while critics warned of delays and rising costs for households"
+).split()
+
+def sentence(rng, n=18):
+    words = [rng.choice(WORDS) for _ in range(n)]
+    return " ".join(words).capitalize() + "."
+
+def make_article(index=0, size_kb=100, date="2026-10-15T10:00:00"):
+    """Returns an HTML article of roughly size_kb kilobytes."""
+    rng = random.Random(index * 7919 + size_kb)
+    head = [
+        f"<title>Article {index} - Example News</title>",
+        f'<meta property="og:title" content="Article {index}">',
+        f'<meta property="og:image" content="https://cdn.example.com/img/{index}.jpg">',
+        '<meta name="twitter:card" content="summary_large_image">',
+        f'<script type="application/ld+json">{{"@context":"https://schema.org","@type":"NewsArticle",'
+        f'"headline":"Article {index}","datePublished":"{date}"}}</script>',
+        "<style>" + "".join(f".c{i}{{margin:{i}px;padding:{i}px}}" for i in range(200)) + "</style>",
+        "<script>" + "var cfg = {};" * 300 + "</script>",
+    ]
+    nav = "<nav><ul>" + "".join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(40)) + "</ul></nav>"
+    footer = "<footer>" + "".join(f'<a href="/related/{i}">{sentence(rng, 6)}</a>' for i in range(60)) + "</footer>"
+    video = f'<iframe src="https://www.youtube.com/embed/v{index}"></iframe>'
+
+    skeleton = len("".join(head)) + len(nav) + len(footer) + 400
+    paragraphs = []
+    body_len = 0
+    while skeleton + body_len < size_kb * 1024:
+        p = "<p>" + " ".join(sentence(rng) for _ in range(5)) + "</p>"
+        paragraphs.append(p)
+        body_len += len(p)
+
+    return (
+        "<!DOCTYPE html><html><head>" + "".join(head) + "</head><body>" + nav
+        + f'<article class="story"><h1>Article {index}</h1><time datetime="{date}">{date}</time>'
+        + "".join(paragraphs) + video + "</article>" + footer + "</body></html>"
+    )
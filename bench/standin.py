@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for DDG Lite, the Google Custom Search API and the article
+sites, used by bench_offline.py.
+
+- POST /lite/               DDG Lite result pages (10 results, "Next Page" form)
+- GET  /customsearch/v1     Custom Search JSON (items, start/num paging)
+- GET  /article/<n>         article HTML: recorded pages from --corpus, or
+                            synthetic ones cycling through --sizes
+
+Every response waits --latency-ms (+/- 50%). A share of requests fails with
+HTTP 500 (--error-rate) and a share of DDG pages is a bot challenge
+(--challenge-rate). The listening port is printed on the first stdout line.
+
+Usage:
+    python bench/standin.py [--port 0] [--latency-ms 50] [--error-rate 0.02] [--challenge-rate 0] [--sizes 20,100,500] [--corpus DIR]
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import random
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from pages import WORDS, make_article
+
+RESULTS_PER_PAGE = 10
+MAX_RESULTS = 50
+
+CHALLENGE_PAGE = (
+    '<html><body><div class="anomaly-modal__title">Unfortunately, bots use DuckDuckGo too.</div>'
+    '<form id="challenge-form" action="/anomaly.js" method="post"></form></body></html>'
+)
+
+def result_number(query, rank):
+    """Stable article number for a query's rank-th result; queries share some articles."""
+    digest = hashlib.md5(query.encode("utf-8")).digest()
+    return (int.from_bytes(digest[:4], "big") + rank * 7) % 997
+
+def snippet(number):
+    rng = random.Random(number)
+    return " ".join(rng.choice(WORDS) for _ in range(25)).capitalize() + "."
+
+def lite_page(base, query, start):
+    rows = []
+    end = min(start + RESULTS_PER_PAGE, MAX_RESULTS)
+    for rank in range(start, end):
+        number = result_number(query, rank)
+        rows.append(
+            f"<tr><td>{rank + 1}.&nbsp;</td><td><a rel=\"nofollow\" href=\"{base}/article/{number}\" "
+            f"class='result-link'>Article {number} - Example News</a></td></tr>"
+            f"<tr><td>&nbsp;</td><td class='result-snippet'>{snippet(number)}</td></tr>"
+            f"<tr><td>&nbsp;</td><td><span class='link-text'>example.com/article/{number}</span></td></tr>"
+        )
+    next_form = ""
+    if end < MAX_RESULTS:
+        next_form = (
+            '<form action="/lite/" method="post">'
+            '<input type="submit" class="navbutton" value="Next Page &gt;">'
+            f'<input type="hidden" name="q" value="{html.escape(query)}">'
+            f'<input type="hidden" name="s" value="{end}">'
+            f'<input type="hidden" name="dc" value="{end + 1}"></form>'
+        )
+    return f"<html><body><table>{''.join(rows)}</table>{next_form}</body></html>"
+
+def google_page(base, query, start, num):
+    items = []
+    for rank in range(start - 1, min(start - 1 + num, MAX_RESULTS)):
+        number = result_number(query, rank)
+        items.append({
+            "title": f"Article {number} - Example News",
+            "link": f"{base}/article/{number}",
+            "snippet": snippet(number)
+        })
+    return {"items": items} if items else {}
+
+class Corpus:
+    """Article HTML by number: recorded files if any, synthetic pages otherwise."""
+    def __init__(self, sizes, directory=None):
+        self.sizes = sizes
+        self.recorded = []
+        if directory:
+            for name in sorted(os.listdir(directory)):
+                if name.endswith((".html", ".htm")):
+                    with open(os.path.join(directory, name), "rb") as f:
+                        self.recorded.append(f.read())
+        self._synthetic = {}
+
+    def page(self, number):
+        if self.recorded:
+            return self.recorded[number % len(self.recorded)]
+        if number not in self._synthetic:
+            size = self.sizes[number % len(self.sizes)]
+            self._synthetic[number] = make_article(number, size).encode("utf-8")
+        return self._synthetic[number]
+
+def make_handler(options, corpus):
+    rng = random.Random()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, code, body, content_type="text/html; charset=utf-8"):
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _delay_or_fail(self):
+            """Injected latency; returns True if this request was answered with an error."""
+            time.sleep(options.latency_ms / 1000 * rng.uniform(0.5, 1.5))
+            if rng.random() < options.error_rate:
+                self._send(500, "Injected error")
+                return True
+            return False
+
+        def _base(self):
+            return f"http://{self.headers.get('Host')}"
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            form = parse_qs(self.rfile.read(length).decode("utf-8"))
+            if urlsplit(self.path).path != "/lite/":
+                return self._send(404, "Not found")
+            if self._delay_or_fail():
+                return
+            if rng.random() < options.challenge_rate:
+                return self._send(200, CHALLENGE_PAGE)
+            query = form.get("q", [""])[0]
+            start = int(form.get("s", ["0"])[0])
+            self._send(200, lite_page(self._base(), query, start))
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path == "/customsearch/v1":
+                if self._delay_or_fail():
+                    return
+                params = parse_qs(parts.query)
+                page = google_page(self._base(), params.get("q", [""])[0],
+                                   int(params.get("start", ["1"])[0]), int(params.get("num", ["10"])[0]))
+                return self._send(200, json.dumps(page), "application/json")
+            if parts.path.startswith("/article/"):
+                if self._delay_or_fail():
+                    return
+                return self._send(200, corpus.page(int(parts.path.rsplit("/", 1)[1])))
+            self._send(404, "Not found")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in search and page server")
+    parser.add_argument("--port", type=int, default=0, help="Port (default: any free port)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mean injected latency per response")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Share of requests answered with HTTP 500")
+    parser.add_argument("--challenge-rate", type=float, default=0.0, help="Share of DDG pages replaced by a bot challenge")
+    parser.add_argument("--sizes", default="20,100,500", help="Synthetic article sizes in KB")
+    parser.add_argument("--corpus", metavar="DIR", help="Serve recorded article HTML files from DIR instead")
+    options = parser.parse_args()
+
+    corpus = Corpus([int(s) for s in options.sizes.split(",")], options.corpus)
+    server = ThreadingHTTPServer(("127.0.0.1", options.port), make_handler(options, corpus))
+    server.daemon_threads = True
+    print(server.server_address[1], flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2866 @@
+#!/usr/bin/env python3
+import json
+import codecs
+import urllib.parse
+import html
+import re
+import argparse
+import sys
+import os
+import random
+import time
+import hashlib
+import math
+import threading
+import queue
+import contextlib
+from collections import deque
+import sqlite3
+import zlib
+import heapq
+import struct
+from datetime import datetime, timedelta
+
+# Heavy dependencies (requests, bs4, lxml, readability, html2text, dateutil)
+# are imported in the code paths that need them, so a cache hit never
+# pays for them. bench/bench_startup.py guards this.
+
+# --- Configuration & Constants ---
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:123.0) Gecko/20100101 Firefox/123.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:123.0) Gecko/20100101 Firefox/123.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_3_1) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.3 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:122.0) Gecko/20100101 Firefox/122.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0"
+]
+
+CACHE_DIR = ".cache"
+CACHE_DB = os.path.join(CACHE_DIR, "cache.sqlite3")
+LEGACY_CACHE_FILE = os.path.join(CACHE_DIR, "results_hash.json")
+CACHE_TTL_HOURS = 24
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # LRU eviction beyond this (stored payload bytes)
+CACHE_COMPRESS_MIN_BYTES = 4096      # Payloads larger than this are zlib-compressed
+CACHE_EXPIRE_BATCH = 64              # Expired rows removed per write (incremental expiry)
+
+MAX_PAGE_BYTES = 2 * 1024 * 1024     # Downloads stop here; the truncated page is still extracted
+METADATA_BODY_BYTES = 64 * 1024      # Metadata-only reads stop this far past </head>
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "application/xml", "text/xml")
+
+PAGE_CACHE_TTL_HOURS = 6             # Pages younger than this are served without any request
+PAGE_CACHE_RETAIN_HOURS = 24 * 7     # Older pages are kept this long for conditional revalidation
+PAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+LOCAL_INDEX_RETAIN_DAYS = 30        # Deep-dived pages stay searchable offline this long
+
+# Tiered extraction: a cheap extractor's body is used instead of readability's when...
+EXTRACT_MIN_CHARS = 500              # ...it has at least this much text
+EXTRACT_MIN_COVERAGE = 0.6           # ...and at least this share of the page's <p> text
+EXTRACT_MAX_LINK_DENSITY = 0.5       # Containers that are mostly link text are navigation, not articles
+# Semantic containers, tried in order; each must occur exactly once on the page
+SEMANTIC_TIERS = (
+    ("microdata", '//*[@itemprop="articleBody"]'),
+    ("article", '//article'),
+    ("main", '//main'),
+)
+SEMANTIC_JUNK = './/script | .//style | .//noscript | .//nav | .//aside | .//footer | .//form | .//button | .//*[@hidden] | .//*[@aria-hidden="true"]'
+
+# Negative cache: failed deep dives are not retried for a while, depending on the failure
+NEGATIVE_TTL_HOURS = {
+    "not_found": 24,      # 404 / 410
+    "forbidden": 6,       # 401 / 402 / 403 / 451, paywalls and bot walls
+    "rate_limited": 0.25, # 429
+    "server_error": 0.25, # 5xx
+    "timeout": 0.5,
+    "connection": 0.5,
+    "unsupported": 24,    # Not HTML (PDF, video...)
+    "empty": 12,          # Fetched, but nothing worth extracting
+    "error": 1,
+}
+NEGATIVE_MIN_CONTENT_CHARS = 200     # Extractions shorter than this count as "empty"
+DOMAIN_FAILURES = ("forbidden", "rate_limited", "server_error", "timeout", "connection")  # Failures that say the host is unhealthy
+DOMAIN_SKIP_AFTER = 3                # Consecutive failures after which a whole domain is skipped...
+DOMAIN_COOLDOWN_HOURS = 1            # ...until this long after its last failure
+DIVE_TIMEOUT = 15                    # Seconds per deep-dive request
+FLAKY_DOMAIN_TIMEOUT = 5             # For domains whose last request failed
+
+# Near-duplicate detection on extracted content (64-bit SimHash over word shingles)
+SIMHASH_SHINGLE = 3
+SIMHASH_MIN_WORDS = 50     # Shorter pages (paywalls, stubs) are never collapsed
+SIMHASH_MAX_DISTANCE = 6   # Differing bits up to which two pages count as the same story
+SIMHASH_MAX_CHARS = 30000  # Only the start of long pages is fingerprinted (~5000 words)
+SIMHASH_SAMPLE = 512       # Shingles voting on the bits: the ones with the smallest hashes
+SIMHASH_VERSION = 3        # Bumped when fingerprints change; cached pages with another one get a new fingerprint
+
+# --budget: deep_content is cut into passages ranked against the query (BM25)
+PASSAGE_MIN_CHARS = 200    # Shorter blocks (headings, one-liners) are merged with the next one
+PASSAGE_MAX_CHARS = 1200   # Longer blocks are split at sentence ends
+BM25_K1 = 1.2
+BM25_B = 0.75
+CHARS_PER_TOKEN = 4        # Rough estimate used by --budget-unit tokens
+PASSAGE_GAP = "[...]"      # Marks text cut between kept passages
+
+DEEP_DIVE_CONCURRENCY = 4
+HOST_JITTER_RANGE = (1.5, 3.5)  # Seconds between two fetches on the same host
+DIVE_POOL_HOSTS = 64       # Hosts whose deep-dive connections are kept open at once
+PRECONNECT_WORKERS = 8     # Background connection warm-ups in flight
+PRECONNECT_IDLE = 30       # Seconds a warmed host is assumed to keep its connection open
+PRECONNECT_TIMEOUT = 5
+
+# Adaptive DDG rate limit (requests/second), shared by every process through the cache DB
+DDG_RATE_INITIAL = 0.5
+DDG_RATE_MIN = 0.05
+DDG_RATE_MAX = 1.0
+DDG_BURST = 2.0
+RATE_SPEEDUP = 1.15      # Rate multiplier after a clean response
+RATE_BACKOFF = 4.0       # Rate divisor after a challenge / 429
+BREAKER_COOLDOWN = 60.0  # Seconds a tripped provider is skipped, doubled per consecutive trip
+BREAKER_MAX_COOLDOWN = 1800.0
+
+DDG_MAX_PAGES = 5         # Result pages followed per DDG Lite query
+# DDG Lite markup, for the --fast regex parser (no soup is built)
+DDG_LINK_PATTERN = r'(?is)<a\b([^>]*\bclass=["\'][^"\']*\bresult-link\b[^>]*)>(.*?)</a>'
+DDG_SNIPPET_PATTERN = r'(?is)<td\b[^>]*\bclass=["\'][^"\']*\bresult-snippet\b[^>]*>(.*?)</td>'
+DDG_FORM_PATTERN = r'(?is)<form\b[^>]*>(.*?)</form>'
+HTML_INPUT_PATTERN = r'(?is)<input\b([^>]*)>'
+HTML_ATTR_PATTERN = r'([\w-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))'
+GOOGLE_MAX_RESULTS = 100  # Custom Search API limit (start + num <= 101)
+
+PREFILTER_GRACE_DAYS = 1   # Slack on rough pre-fetch dates before a result is dropped
+OVERFETCH_FACTOR = 2.0     # With --time and --deep, candidates requested per wanted result
+
+HEDGE_AFTER_SECONDS = 4.0  # Auto mode: fire the next provider if the current one is slower than this
+
+BATCH_CONCURRENCY = 4
+# Searches in flight per provider, across all batch workers
+PROVIDER_CONCURRENCY = {"DDGLiteProvider": 1, "GoogleCustomSearchProvider": 4, "LocalIndexProvider": 8}
+
+# --- Helper Functions ---
+
+def get_random_header_dict():
+    return {
+        "User-Agent": random.choice(USER_AGENTS),
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+        "Accept-Language": "en-US,en;q=0.9",
+        "Referer": "https://www.google.com/",
+        "DNT": "1",
+        "Upgrade-Insecure-Requests": "1",
+        "Sec-Fetch-Dest": "document",
+        "Sec-Fetch-Mode": "navigate",
+        "Sec-Fetch-Site": "cross-site",
+        "Sec-Fetch-User": "?1",
+        "Connection": "keep-alive",
+    }
+
+# Search engine click-through wrappers: host -> query parameter holding the target
+REDIRECT_WRAPPERS = {
+    "duckduckgo.com": "uddg",
+    "lite.duckduckgo.com": "uddg",
+    "html.duckduckgo.com": "uddg",
+    "www.google.com": "q",
+    "google.com": "q",
+}
+# Patterns are kept as strings (compiled by re on first use) so a cache hit never compiles them
+TRACKING_PARAMS = r'(?i)^(utm_\w+|fbclid|gclid|dclid|msclkid|yclid|igshid|mc_cid|mc_eid|_hsenc|_hsmi|ref_src|ref_url|cmpid|ncid|guccounter)$'
+# AMP variants of an article, folded into the canonical page for keys
+AMP_PARAMS = r'(?i)^(amp|outputtype)$'
+AMP_SUFFIX = r'(?i)\.amp(?=\.html?$|$)'
+# Labels that, followed by a TLD, are a public suffix (co.uk, com.au...), not a registrable domain
+SECOND_LEVEL_LABELS = ("co", "com", "net", "org", "gov", "edu", "ac")
+
+def strip_host_prefix(host, prefix):
+    """host without prefix ("www.", "amp."), unless no registrable domain would be left."""
+    if not host.startswith(prefix):
+        return host
+    labels = host[len(prefix):].split(".")
+    if len(labels) < 2 or (len(labels) == 2 and labels[0] in SECOND_LEVEL_LABELS):
+        return host
+    return host[len(prefix):]
+
+def fold_amp_path(path):
+    """
+    Path of the regular page behind an AMP path: drops a trailing or
+    leading /amp segment and a .amp suffix. A segment is only dropped if
+    what is left still names an article (two segments, or a slug-like one),
+    so sections and tags called "amp" (/tag/amp, /news/amp) stay apart.
+    """
+    def names_article(segments):
+        return len(segments) >= 2 or (segments and re.search(r'[-_.\d]', segments[-1]))
+
+    segments = [segment for segment in path.split("/") if segment]
+    if segments and segments[-1].lower() == "amp" and names_article(segments[:-1]):
+        segments = segments[:-1]
+    elif segments and segments[0].lower() == "amp" and names_article(segments[1:]):
+        segments = segments[1:]
+    return re.sub(AMP_SUFFIX, "", "/" + "/".join(segments))
+
+def canonical_url(url):
+    """
+    Cleans a result URL without changing the page it points to: unwraps
+    search engine redirect links and drops tracking parameters and the
+    fragment. The result is what gets fetched.
+    """
+    url = url.strip()
+    if url.startswith("//"):
+        url = "https:" + url
+    for _ in range(3):  # Wrappers can be nested
+        parts = urllib.parse.urlsplit(url)
+        param = REDIRECT_WRAPPERS.get((parts.hostname or "").lower())
+        target = urllib.parse.parse_qs(parts.query).get(param) if param else None
+        if not target or not target[0].startswith(("http://", "https://")):
+            break
+        url = target[0]
+    parts = urllib.parse.urlsplit(url)
+    # Filtered on the raw pairs so the remaining query keeps its exact encoding
+    query = "&".join(pair for pair in parts.query.split("&")
+                     if pair and not re.match(TRACKING_PARAMS, urllib.parse.unquote_plus(pair.split("=", 1)[0])))
+    return urllib.parse.urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+def normalize_url(url):
+    """
+    Normalizes a URL for use as a dedup and cache key: the canonical_url
+    with http/https, www. and AMP variants, default ports, trailing slashes
+    and query order folded together.
+    """
+    parts = urllib.parse.urlsplit(canonical_url(url))
+    scheme = parts.scheme.lower()
+    if scheme == "http":
+        scheme = "https"
+    host = (parts.hostname or "").lower()
+    for prefix in ("www.", "amp."):
+        host = strip_host_prefix(host, prefix)
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = fold_amp_path(parts.path).rstrip("/") or "/"
+    query = sorted((k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+                   if not re.match(AMP_PARAMS, k))
+    return urllib.parse.urlunsplit((scheme, host, path, urllib.parse.urlencode(query), ""))
+
+def clean_text(text):
+    if not text: return ""
+    return re.sub(r'\s+', ' ', text).strip()
+
+class HostThrottle:
+    """
+    Per-host politeness: the first request to a host goes out immediately,
+    later ones are spaced by a random jitter. Thread-safe.
+    """
+    def __init__(self, jitter=HOST_JITTER_RANGE):
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        host = (urllib.parse.urlsplit(url).hostname or "").lower()
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + random.uniform(*self.jitter)
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+# --- Instrumentation ---
+
+class StageTimer:
+    """
+    Stage durations of one deep dive, for --timings. lap(name) charges the
+    time since the previous lap to name; add() records a stage measured
+    elsewhere (DNS and connect, from the connection hook), which is then
+    left out of the lap it happened in.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.page_cache = None  # Page cache outcome: hit, miss, revalidated, digest
+        self._last = time.perf_counter()
+        self._nested = 0.0
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + now - self._last - self._nested
+        self._last = now
+        self._nested = 0.0
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self._nested += seconds
+
+    def as_dict(self):
+        timings = {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+        if self.page_cache:
+            timings["page_cache"] = self.page_cache
+        return timings
+
+def elapsed_ms(since):
+    return round((time.perf_counter() - since) * 1000, 1)
+
+# The StageTimer of the deep dive running on this thread, if any
+_active_timer = threading.local()
+
+def install_connection_hook():
+    """
+    Wraps urllib3's socket setup so new connections resolve the host and
+    connect as two timed steps, charged to the calling thread's StageTimer
+    as "dns" and "connect". Resolved addresses are cached for the process
+    lifetime (so a server keeps them across searches) and re-resolved only
+    when none of them accepts a connection. Idempotent.
+    """
+    import socket
+    from urllib3.util import connection
+
+    if getattr(connection.create_connection, "timed", False):
+        return
+    create_connection = connection.create_connection
+
+    def timed_create_connection(address, *args, **kwargs):
+        timer = getattr(_active_timer, "timer", None)
+        host, port = address
+        start = time.perf_counter()
+        addresses = _dns_cache.get(address)
+        if addresses is None:
+            addresses = list(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)))
+            _dns_cache[address] = addresses
+        resolved = time.perf_counter()
+        error = None
+        for ip in addresses:
+            try:
+                sock = create_connection((ip, port), *args, **kwargs)
+                break
+            except OSError as e:
+                error = e
+        else:
+            _dns_cache.pop(address, None)
+            raise error or OSError(f"getaddrinfo returned no addresses for {host}")
+        if timer:
+            timer.add("dns", resolved - start)
+            timer.add("connect", time.perf_counter() - resolved)
+        return sock
+
+    timed_create_connection.timed = True
+    connection.create_connection = timed_create_connection
+
+_dns_cache = {}  # (host, port) -> addresses, see install_connection_hook
+
+def preconnect(session, url):
+    """
+    Opens a connection to url's host (DNS, TCP, TLS) and parks it in
+    session's pool, so a deep dive that follows starts with its request.
+    Best effort: any error is left for the dive itself to report.
+    """
+    import requests
+
+    try:
+        adapter = session.get_adapter(url)
+        settings = session.merge_environment_settings(url, {}, None, None, None)
+        if hasattr(adapter, "get_connection_with_tls_context"):
+            request = requests.Request("GET", url).prepare()
+            pool = adapter.get_connection_with_tls_context(request, settings['verify'], settings['proxies'], settings['cert'])
+        else:
+            pool = adapter.get_connection(url, settings['proxies'])
+        # No idle slot: every connection to the host is in use already
+        if pool.pool is None or pool.pool.empty():
+            return
+        conn = pool._get_conn()
+    except Exception:
+        return
+    try:
+        if conn.sock is None:
+            conn.timeout = PRECONNECT_TIMEOUT
+            conn.connect()
+    except Exception:
+        conn.close()
+    finally:
+        pool._put_conn(conn)
+
+class RunProfiler:
+    """
+    --profile: cProfile of the search (main thread) and of every deep dive
+    (worker threads, one profile per call), merged into one pstats dump.
+    Python 3.12+ allows only one active profiler, so there the deep dives
+    run unprofiled while the main thread's profile is running.
+    """
+    def __init__(self):
+        self.profiles = []
+        self.warned = False
+        self._lock = threading.Lock()
+
+    def call(self, fn, *args, **kwargs):
+        import cProfile
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # "Another profiling tool is already active"
+            with self._lock:
+                warn, self.warned = not self.warned, True
+            if warn:
+                sys.stderr.write(f"DEBUG: --profile: deep dive workers run unprofiled ({e})\n")
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._lock:
+                self.profiles.append(profile)
+
+    def dump(self, path):
+        import pstats
+
+        stats = pstats.Stats(self.profiles[0])
+        for profile in self.profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+
+# --- Cache System ---
+
+def get_cache_key(query, args, include_count=True):
+    """
+    Generates a unique hash for the query and relevant arguments.
+    Without the count, the hash identifies every result-set size of the same
+    query (see CacheStore.get_largest).
+    """
+    # We include query, deep mode, time filter, count in the hash
+    key_data = {
+        "query": query,
+        "deep": args.deep,
+        "time": args.time,
+        "media": getattr(args, 'media', False)
+    }
+    if getattr(args, 'blend_local', False):
+        key_data["blend_local"] = True
+    if getattr(args, 'metadata_only', False):
+        key_data["metadata_only"] = True
+    if include_count:
+        key_data["count"] = args.count
+    key_str = json.dumps(key_data, sort_keys=True)
+    return hashlib.md5(key_str.encode('utf-8')).hexdigest()
+
+class CacheDB:
+    """
+    Base of the stores kept in the SQLite cache DB (CacheStore, LocalIndex,
+    FailureMemory, AdaptiveRateLimiter): one WAL-mode connection per store,
+    shared between threads under _lock, and transaction() for writes.
+    """
+    def __init__(self, path=CACHE_DB):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Holds _lock for a BEGIN IMMEDIATE ... COMMIT block, so reads in it
+        see no concurrent writer; any exception rolls it back.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+
+class CacheStore(CacheDB):
+    """
+    Keyed result cache in SQLite (WAL mode): O(1) lookups by key, atomic
+    writes, safe for parallel invocations. Expired rows are swept a batch at
+    a time on write, and the least recently used rows are evicted once the
+    stored payloads exceed max_bytes, tracked as a running total in
+    cache_meta. Large payloads are zlib-compressed.
+    """
+    table = "results"
+    # (name, type, indexed): base = get_cache_key without count, requested = the count asked for
+    extra_columns = (("base", "TEXT", True), ("requested", "INTEGER", False))
+
+    def __init__(self, path=CACHE_DB, ttl_hours=CACHE_TTL_HOURS, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.size_key = f"{self.table}_bytes"
+        self.ttl = ttl_hours * 3600
+        self.max_bytes = max_bytes
+        super().__init__(path)
+        extra = "".join(f", {name} {kind}" for name, kind, _ in self.extra_columns)
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                size INTEGER NOT NULL,
+                compressed INTEGER NOT NULL,
+                payload BLOB NOT NULL{extra}
+            );
+            CREATE INDEX IF NOT EXISTS {self.table}_created ON {self.table}(created);
+            CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table}(accessed);
+        """)
+        # Stores created before a column was introduced get it added in place
+        existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({self.table})")}
+        for name, kind, indexed in self.extra_columns:
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE {self.table} ADD COLUMN {name} {kind}")
+            if indexed:
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_{name} ON {self.table}({name})")
+        # Running total of stored payload bytes, kept in step by every write; summed once per new store
+        self._conn.executescript("CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute(
+            f"INSERT OR IGNORE INTO cache_meta (name, value) SELECT ?, CAST(total(size) AS INTEGER) FROM {self.table}",
+            (self.size_key,))
+
+    @staticmethod
+    def encode(data):
+        raw = json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+        if len(raw) >= CACHE_COMPRESS_MIN_BYTES:
+            return zlib.compress(raw, 6), 1
+        return raw, 0
+
+    @staticmethod
+    def decode(payload, compressed):
+        if compressed:
+            payload = zlib.decompress(payload)
+        return json.loads(payload)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT payload, compressed FROM {self.table} WHERE key = ? AND created > ?",
+                (key, now - self.ttl)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+        try:
+            return self.decode(*row)
+        except Exception:
+            return None
+
+    def get_largest(self, base):
+        """Returns (data, requested) for the largest fresh result set sharing base, or None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT key, payload, compressed, requested FROM {self.table} WHERE base = ? AND created > ? "
+                "ORDER BY requested DESC LIMIT 1",
+                (base, now - self.ttl)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, row[0]))
+        try:
+            return self.decode(row[1], row[2]), row[3]
+        except Exception:
+            return None
+
+    def put(self, key, data, created=None, **extra):
+        payload, compressed = self.encode(data)
+        now = time.time()
+        extra_names = tuple(name for name, _, _ in self.extra_columns)
+        columns = ("key", "created", "accessed", "size", "compressed", "payload") + extra_names
+        values = (key, created or now, now, len(payload), compressed, payload) + tuple(extra.get(name) for name in extra_names)
+        with self.transaction() as conn:
+            replaced = conn.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                values)
+            total = self._add_size(len(payload) - (replaced[0] if replaced else 0))
+            total = self._expire(now, total)
+            self._evict(total)
+
+    def _add_size(self, delta):
+        """Adjusts the running size total (inside a transaction) and returns it."""
+        self._conn.execute("UPDATE cache_meta SET value = value + ? WHERE name = ?", (delta, self.size_key))
+        return self._conn.execute("SELECT value FROM cache_meta WHERE name = ?", (self.size_key,)).fetchone()[0]
+
+    def _expire(self, now, total):
+        # Incremental expiry: a bounded batch per write instead of a full sweep
+        expired = self._conn.execute(
+            f"SELECT rowid, size FROM {self.table} WHERE created <= ? ORDER BY created LIMIT ?",
+            (now - self.ttl, CACHE_EXPIRE_BATCH)).fetchall()
+        if not expired:
+            return total
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE rowid = ?", [(rowid,) for rowid, _ in expired])
+        return self._add_size(-sum(size for _, size in expired))
+
+    def _evict(self, total):
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        victims = []
+        freed = 0
+        for key, size in self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", victims)
+        self._add_size(-freed)
+
+    def import_legacy(self, legacy_file=LEGACY_CACHE_FILE):
+        """One-time migration of the old monolithic results_hash.json."""
+        if not os.path.exists(legacy_file):
+            return
+        try:
+            with open(legacy_file, 'r') as f:
+                legacy = json.load(f)
+            for key, entry in legacy.items():
+                created = datetime.fromisoformat(entry['timestamp']).timestamp()
+                if time.time() - created < self.ttl:
+                    self.put(key, entry['data'], created=created)
+        except Exception as e:
+            sys.stderr.write(f"DEBUG: Legacy cache import failed: {e}\n")
+        try:
+            os.replace(legacy_file, legacy_file + ".migrated")
+        except OSError:
+            pass  # Another process migrated it first
+
+class PageCache(CacheStore):
+    """
+    Per-URL cache of deep-dive extractions (markdown, date, title, media),
+    keyed on the normalized URL. Entries are served as-is while fresh; past
+    that they are kept for conditional revalidation with their ETag /
+    Last-Modified validators, so an unchanged page costs a 304 and no parse.
+    """
+    table = "pages"
+    # digest = SHA-1 of the downloaded HTML, to reuse extractions of byte-identical pages
+    extra_columns = (("etag", "TEXT", False), ("last_modified", "TEXT", False), ("digest", "TEXT", True))
+
+    def __init__(self, path=CACHE_DB, fresh_hours=PAGE_CACHE_TTL_HOURS,
+                 retain_hours=PAGE_CACHE_RETAIN_HOURS, max_bytes=PAGE_CACHE_MAX_BYTES):
+        super().__init__(path, ttl_hours=retain_hours, max_bytes=max_bytes)
+        self.fresh = fresh_hours * 3600
+
+    def lookup(self, url):
+        """Returns {'data', 'etag', 'last_modified', 'fresh'} for url, or None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, compressed, created, etag, last_modified FROM pages WHERE key = ? AND created > ?",
+                (url, now - self.ttl)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE pages SET accessed = ? WHERE key = ?", (now, url))
+        try:
+            data = self.decode(row[0], row[1])
+        except Exception:
+            return None
+        return {
+            "data": data,
+            "etag": row[3],
+            "last_modified": row[4],
+            "fresh": now - row[2] < self.fresh
+        }
+
+    def is_fresh(self, url):
+        """Whether url would be served from the cache without any request."""
+        with self._lock:
+            row = self._conn.execute("SELECT created FROM pages WHERE key = ?", (url,)).fetchone()
+        return row is not None and time.time() - row[0] < self.fresh
+
+    def find_digest(self, digest):
+        """Returns the extraction of any cached page whose HTML had this digest, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, compressed FROM pages WHERE digest = ? AND created > ? LIMIT 1",
+                (digest, time.time() - self.ttl)).fetchone()
+        if row is None:
+            return None
+        try:
+            return self.decode(*row)
+        except Exception:
+            return None
+
+    def revalidated(self, url):
+        """Marks url as fresh again after a 304 Not Modified."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("UPDATE pages SET created = ?, accessed = ? WHERE key = ?", (now, now, url))
+
+class LocalIndex(CacheDB):
+    """
+    Full-text index (SQLite FTS5) of every deep-dived page, in the cache DB:
+    URL, title, extracted date and markdown. Backs the local provider, which
+    answers from it in milliseconds without any network. Pages are keyed on
+    the normalized URL, re-indexed on each fetch (see needs_indexing for
+    page cache hits) and dropped after retain_days.
+    """
+    def __init__(self, path=CACHE_DB, retain_days=LOCAL_INDEX_RETAIN_DAYS):
+        self.retain = retain_days * 86400
+        super().__init__(path)
+        # External-content FTS table: the text is stored once, in local_pages
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS local_pages (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                url TEXT NOT NULL,
+                title TEXT,
+                extracted_date TEXT,
+                indexed REAL NOT NULL,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS local_pages_indexed ON local_pages(indexed);
+            CREATE VIRTUAL TABLE IF NOT EXISTS local_fts USING fts5(
+                title, content, content='local_pages', content_rowid='id', tokenize='porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS local_pages_ai AFTER INSERT ON local_pages BEGIN
+                INSERT INTO local_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS local_pages_ad AFTER DELETE ON local_pages BEGIN
+                INSERT INTO local_fts(local_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+            END;
+        """)
+
+    def add(self, url, title, extracted_date, content):
+        now = time.time()
+        key = normalize_url(url)
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM local_pages WHERE key = ?", (key,))
+            conn.execute(
+                "INSERT INTO local_pages (key, url, title, extracted_date, indexed, content) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, url, title, extracted_date, now, content))
+            # Incremental expiry, as in CacheStore
+            conn.execute(
+                "DELETE FROM local_pages WHERE id IN (SELECT id FROM local_pages WHERE indexed <= ? ORDER BY indexed LIMIT ?)",
+                (now - self.retain, CACHE_EXPIRE_BATCH))
+
+    def needs_indexing(self, url):
+        """
+        Whether a page served from the page cache should be (re-)indexed:
+        only if it is missing or past half its retention, so a cache hit
+        normally costs one read here instead of an FTS rewrite.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT indexed FROM local_pages WHERE key = ?", (normalize_url(url),)).fetchone()
+        return row is None or time.time() - row[0] > self.retain / 2
+
+    def search(self, query, count=5, time_filter=None):
+        """
+        Best-matching pages for query (BM25, title weighted double), as
+        search results carrying their deep_content. Pages matching every
+        term come first, then pages matching any. Undated pages pass
+        time_filter, as in the post-fetch date check.
+        """
+        terms = ['"' + term.replace('"', '') + '"' for term in tokenize(query)]
+        if not terms:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            for match in (" AND ".join(terms), " OR ".join(terms)):
+                rows = self._conn.execute(
+                    "SELECT p.key, p.url, p.title, p.extracted_date, snippet(local_fts, 1, '', '', '...', 24), p.content "
+                    "FROM local_fts JOIN local_pages p ON p.id = local_fts.rowid "
+                    "WHERE local_fts MATCH ? AND p.indexed > ? ORDER BY bm25(local_fts, 2.0, 1.0)",
+                    (match, time.time() - self.retain))
+                for key, url, title, extracted_date, snippet, content in rows:
+                    if len(results) >= count:
+                        break
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    if time_filter and extracted_date and not is_date_relevant(datetime.fromisoformat(extracted_date), time_filter):
+                        continue
+                    results.append({
+                        "title": title,
+                        "url": url,
+                        "snippet": clean_text(snippet),
+                        "source": "local",
+                        "extracted_date": extracted_date,
+                        "deep_content": content
+                    })
+                if len(results) >= count:
+                    break
+        return results
+
+class FailureMemory(CacheDB):
+    """
+    Negative cache of deep-dive failures plus per-domain failure stats, in
+    the cache DB. A failed URL is skipped until its status-dependent TTL
+    (NEGATIVE_TTL_HOURS) runs out; a domain with DOMAIN_SKIP_AFTER
+    consecutive failures is skipped for DOMAIN_COOLDOWN_HOURS, and one whose
+    last request failed gets a shorter timeout.
+    """
+    def __init__(self, path=CACHE_DB):
+        super().__init__(path)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS failed_urls (
+                key TEXT PRIMARY KEY,
+                failure TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS failed_urls_expires ON failed_urls(expires);
+            CREATE TABLE IF NOT EXISTS domain_stats (
+                host TEXT PRIMARY KEY,
+                successes INTEGER NOT NULL,
+                failures INTEGER NOT NULL,
+                consecutive INTEGER NOT NULL,
+                last_failure REAL NOT NULL
+            );
+        """)
+
+    @staticmethod
+    def host(url):
+        return (urllib.parse.urlsplit(url).hostname or "").lower()
+
+    def _domain(self, host):
+        row = self._conn.execute(
+            "SELECT successes, failures, consecutive, last_failure FROM domain_stats WHERE host = ?", (host,)).fetchone()
+        return row or (0, 0, 0, 0.0)
+
+    def skip_reason(self, url):
+        """Why url should not be fetched now, or None."""
+        now = time.time()
+        host = self.host(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT failure FROM failed_urls WHERE key = ? AND expires > ?", (normalize_url(url), now)).fetchone()
+            _, _, consecutive, last_failure = self._domain(host)
+        if row:
+            return f"Known failure: {row[0]}"
+        if consecutive >= DOMAIN_SKIP_AFTER and now - last_failure < DOMAIN_COOLDOWN_HOURS * 3600:
+            return f"Failing domain: {host} ({consecutive} failures in a row)"
+        return None
+
+    def timeout_for(self, url):
+        now = time.time()
+        with self._lock:
+            _, _, consecutive, last_failure = self._domain(self.host(url))
+        if consecutive and now - last_failure < DOMAIN_COOLDOWN_HOURS * 3600:
+            return FLAKY_DOMAIN_TIMEOUT
+        return DIVE_TIMEOUT
+
+    def failed(self, url, failure):
+        now = time.time()
+        ttl = NEGATIVE_TTL_HOURS.get(failure, NEGATIVE_TTL_HOURS["error"]) * 3600
+        host = self.host(url)
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO failed_urls (key, failure, expires) VALUES (?, ?, ?)",
+                (normalize_url(url), failure, now + ttl))
+            if failure in DOMAIN_FAILURES:
+                successes, failures, consecutive, _ = self._domain(host)
+                conn.execute(
+                    "INSERT OR REPLACE INTO domain_stats (host, successes, failures, consecutive, last_failure) VALUES (?, ?, ?, ?, ?)",
+                    (host, successes, failures + 1, consecutive + 1, now))
+            conn.execute("DELETE FROM failed_urls WHERE key IN (SELECT key FROM failed_urls WHERE expires <= ? LIMIT ?)",
+                         (now, CACHE_EXPIRE_BATCH))
+
+    def succeeded(self, url):
+        host = self.host(url)
+        with self.transaction() as conn:
+            successes, failures, _, last_failure = self._domain(host)
+            conn.execute(
+                "INSERT OR REPLACE INTO domain_stats (host, successes, failures, consecutive, last_failure) VALUES (?, ?, ?, 0, ?)",
+                (host, successes + 1, failures, last_failure))
+
+_cache_store = None
+_page_cache = None
+_local_index = None
+_failure_memory = None
+_cache_init_lock = threading.Lock()
+
+def get_cache_store():
+    global _cache_store
+    with _cache_init_lock:
+        if _cache_store is None:
+            _cache_store = CacheStore()
+            _cache_store.import_legacy()
+    return _cache_store
+
+def get_page_cache():
+    global _page_cache
+    with _cache_init_lock:
+        if _page_cache is None:
+            _page_cache = PageCache()
+    return _page_cache
+
+def get_local_index():
+    global _local_index
+    with _cache_init_lock:
+        if _local_index is None:
+            _local_index = LocalIndex()
+    return _local_index
+
+def get_failure_memory():
+    global _failure_memory
+    with _cache_init_lock:
+        if _failure_memory is None:
+            _failure_memory = FailureMemory()
+    return _failure_memory
+
+def get_cached_result(cache_key):
+    return get_cache_store().get(cache_key)
+
+def get_cached_superset(query, args):
+    """
+    Returns (data, requested_count) for the largest cached result set of the
+    same query, time, deep and media parameters, whatever its count, or None.
+    """
+    return get_cache_store().get_largest(get_cache_key(query, args, include_count=False))
+
+def store_cached_result(cache_key, data, query=None, args=None):
+    extra = {}
+    if args is not None:
+        extra = {"base": get_cache_key(query, args, include_count=False), "requested": args.count}
+    get_cache_store().put(cache_key, data, **extra)
+
+# --- HTML Parsing ---
+
+_parser_local = threading.local()  # lxml parser objects must not be shared across threads
+
+def parse_html(html_content):
+    """
+    Parses a page once into an lxml tree. Date, media and readability
+    extraction all run off this tree instead of re-parsing the string.
+    """
+    import lxml.html
+
+    parser = getattr(_parser_local, 'parser', None)
+    if parser is None:
+        parser = _parser_local.parser = lxml.html.HTMLParser(encoding='utf-8')
+    # Parse as UTF-8 bytes: lxml refuses str input carrying an XML encoding declaration
+    return lxml.html.document_fromstring(html_content.encode('utf-8', 'replace'), parser=parser)
+
+# --- Date Extraction ---
+
+DATE_META_TARGETS = [
+    ('property', 'article:published_time'),
+    ('name', 'date'),
+    ('name', 'pubdate'),
+    ('name', 'original-publish-date'),
+    ('name', 'publication_date'),
+    ('property', 'og:published_time'),
+    ('name', 'DC.date.issued'),
+    ('name', 'citation_date')
+]
+
+MONTHS = {m: i + 1 for i, m in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'))}
+
+# Dates search engines put at the start of a snippet: "Oct 25, 2023 - ...", "25 Oct 2023", "2023-10-25", "3 days ago"
+SNIPPET_DATE_PATTERNS = [
+    (r'^\s*([A-Za-z]{3})[a-z]*\.? (\d{1,2}), (\d{4})\b', lambda m: (m[3], m[1], m[2])),
+    (r'^\s*(\d{1,2}) ([A-Za-z]{3})[a-z]*\.? (\d{4})\b', lambda m: (m[3], m[2], m[1])),
+    (r'^\s*(\d{4})-(\d{2})-(\d{2})\b', lambda m: (m[1], m[2], m[3])),
+]
+SNIPPET_AGO_PATTERN = r'(?i)^\s*(\d+) (minute|hour|day|week)s? ago\b'
+
+def extract_date_from_url(url):
+    """Date from a /YYYY/MM/DD/ URL path segment, or None."""
+    url_date = re.search(r'/(\d{4})/(\d{2})/(\d{2})/', url or "")
+    if url_date:
+        try:
+            return datetime(int(url_date.group(1)), int(url_date.group(2)), int(url_date.group(3)))
+        except ValueError:
+            pass
+    return None
+
+def extract_date_from_snippet(snippet):
+    """Date hint at the start of a search snippet (absolute or 'N days ago'), or None."""
+    if not snippet:
+        return None
+    ago = re.match(SNIPPET_AGO_PATTERN, snippet)
+    if ago:
+        return datetime.now() - timedelta(**{ago.group(2).lower() + 's': int(ago.group(1))})
+    for pattern, parts in SNIPPET_DATE_PATTERNS:
+        match = re.match(pattern, snippet)
+        if match:
+            year, month, day = parts(match)
+            month = int(month) if month.isdigit() else MONTHS.get(month.lower())
+            try:
+                return datetime(int(year), month, int(day))
+            except (TypeError, ValueError):
+                return None
+    return None
+
+def extract_date_from_html(html_content, url=""):
+    """Parses html_content and extracts its publication date (see extract_date_from_tree)."""
+    try:
+        return extract_date_from_tree(parse_html(html_content), url)
+    except Exception:
+        return None
+
+def extract_date_from_tree(tree, url=""):
+    """
+    Extracts the publication date from a parsed page using various heuristics:
+    1. JSON-LD structured data
+    2. Meta tags (article:published_time, date, etc.)
+    3. URL patterns (often contain YYYY/MM/DD)
+    4. Visible <time> tag (fallback)
+    Returns a datetime object or None.
+    """
+    from dateutil import parser as date_parser
+
+    try:
+        # 1. JSON-LD
+        for script in tree.xpath('//script[@type="application/ld+json"]'):
+            try:
+                data = json.loads(script.text)
+                if isinstance(data, list): data = data[0]
+                date_str = data.get('datePublished') or data.get('dateCreated') or data.get('uploadDate')
+                if date_str:
+                    return date_parser.parse(date_str)
+            except:
+                continue
+
+        # 2. Meta Tags
+        for attr, value in DATE_META_TARGETS:
+            tags = tree.xpath(f'//meta[@{attr}=$value]', value=value)
+            if tags and tags[0].get('content'):
+                try:
+                    return date_parser.parse(tags[0].get('content'))
+                except:
+                    continue
+
+        # 3. URL Regex (e.g., /2023/10/25/...)
+        url_date = extract_date_from_url(url)
+        if url_date:
+            return url_date
+
+        # 4. Visible Time tag
+        time_tags = tree.xpath('//time')
+        if time_tags and time_tags[0].get('datetime'):
+             try:
+                return date_parser.parse(time_tags[0].get('datetime'))
+             except:
+                pass
+
+    except Exception as e:
+        # sys.stderr.write(f"Date extraction error: {e}\n")
+        pass
+    
+    return None
+
+def is_date_relevant(date_obj, time_filter):
+    """
+    Checks if date_obj is within the time_filter ('d', 'w', 'm', 'y').
+    """
+    if not date_obj:
+        return True # Keep if unknown? Or strict mode? Let's keep for now.
+    
+    # Ensure date_obj is offset-naive for comparison or make both aware
+    if date_obj.tzinfo is not None:
+        date_obj = date_obj.replace(tzinfo=None)
+        
+    now = datetime.now()
+    
+    if time_filter == 'd':
+        return now - date_obj <= timedelta(days=1)
+    elif time_filter == 'w':
+        return now - date_obj <= timedelta(weeks=1)
+    elif time_filter == 'm':
+        return now - date_obj <= timedelta(days=30)
+    elif time_filter == 'y':
+        return now - date_obj <= timedelta(days=365)
+        
+    return True
+
+def is_clearly_stale(date_obj, time_filter):
+    """
+    Pre-fetch check on a rough date (URL, snippet, Last-Modified): True only
+    if it is outside time_filter even with PREFILTER_GRACE_DAYS of slack.
+    """
+    if not date_obj or not time_filter:
+        return False
+    return not is_date_relevant(date_obj + timedelta(days=PREFILTER_GRACE_DAYS), time_filter)
+
+def prefilter_by_date(res, time_filter):
+    """
+    Marks res filtered_out (before any fetch) when its URL or snippet date is
+    clearly outside time_filter. Returns True if it was filtered.
+    """
+    for source, date_obj in (("URL", extract_date_from_url(res.get('url'))),
+                             ("snippet", extract_date_from_snippet(res.get('snippet')))):
+        if is_clearly_stale(date_obj, time_filter):
+            res['filtered_out'] = True
+            res['filter_reason'] = f"Pre-fetch: {source} date {date_obj} outside range {time_filter}"
+            return True
+    return False
+
+def head_last_modified(url, session):
+    """Last-Modified of url from a HEAD request, or None."""
+    from email.utils import parsedate_to_datetime
+
+    try:
+        response = session.head(url, headers=get_random_header_dict(), timeout=5, allow_redirects=True)
+        value = response.headers.get('Last-Modified')
+        return parsedate_to_datetime(value) if value else None
+    except Exception:
+        return None
+
+# --- Deep Dive Content Extraction ---
+
+def extract_media_from_tree(tree):
+    """Returns (image_url, video_urls) from og/twitter image meta tags and video iframes."""
+    image_url = None
+    video_urls = []
+
+    # 1. Image
+    og_image = tree.xpath('//meta[@property="og:image"]/@content')
+    twitter_image = tree.xpath('//meta[@name="twitter:image"]/@content')
+    if og_image and og_image[0]:
+        image_url = og_image[0]
+    elif twitter_image and twitter_image[0]:
+        image_url = twitter_image[0]
+
+    # 2. Videos (iframes)
+    # Basic check for youtube/vimeo in src
+    for src in tree.xpath('//iframe/@src'):
+        if 'youtube.com' in src or 'youtu.be' in src or 'vimeo.com' in src:
+            video_urls.append(src)
+
+    return image_url, video_urls
+
+def make_html2text():
+    import html2text
+
+    h = html2text.HTML2Text()
+    h.ignore_links = False
+    h.ignore_images = True
+    h.body_width = 0 # No wrapping
+    return h
+
+def page_text_chars(element):
+    return len(" ".join(element.text_content().split()))
+
+def jsonld_article_body(tree):
+    """articleBody of the page's JSON-LD (nested @graph / lists included), or None."""
+    for script in tree.xpath('//script[@type="application/ld+json"]'):
+        try:
+            stack = [json.loads(script.text)]
+        except:
+            continue
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, dict):
+                body = item.get('articleBody')
+                if isinstance(body, str) and body.strip():
+                    return body
+                stack.extend(v for v in item.values() if isinstance(v, (list, dict)))
+    return None
+
+def extract_body_tiered(tree):
+    """
+    Cheap body extractors, tried before readability: JSON-LD articleBody,
+    then a single itemprop="articleBody", <article> or <main> container
+    (AMP pages included). A candidate is kept only if it passes the quality
+    check (EXTRACT_MIN_CHARS, EXTRACT_MIN_COVERAGE, and for containers
+    EXTRACT_MAX_LINK_DENSITY). Returns (markdown, tier) or (None, None).
+    The tree is left untouched.
+    """
+    import copy
+    import lxml.html
+
+    paragraph_chars = sum(page_text_chars(p) for p in tree.iter('p'))
+
+    def good(chars):
+        return chars >= EXTRACT_MIN_CHARS and chars >= EXTRACT_MIN_COVERAGE * paragraph_chars
+
+    body = jsonld_article_body(tree)
+    if body and good(len(" ".join(body.split()))):
+        if re.search(r'(?i)<(p|br|div)\b', body):
+            return make_html2text().handle(body), "jsonld"
+        paragraphs = [line.strip() for line in body.splitlines() if line.strip()]
+        return "\n\n".join(paragraphs) + "\n", "jsonld"
+
+    for tier, xpath in SEMANTIC_TIERS:
+        found = tree.xpath(xpath)
+        if len(found) != 1:
+            continue
+        container = copy.deepcopy(found[0])
+        for junk in container.xpath(SEMANTIC_JUNK):
+            junk.drop_tree()
+        chars = page_text_chars(container)
+        link_chars = sum(page_text_chars(a) for a in container.iter('a'))
+        if good(chars) and link_chars <= EXTRACT_MAX_LINK_DENSITY * chars:
+            return make_html2text().handle(lxml.html.tostring(container, encoding='unicode')), tier
+    return None, None
+
+def extract_page(html_content, url="", extract_media=False, timer=None, metadata_only=False, tiered=True):
+    """
+    Single-parse extraction pipeline: parses html_content once, then runs
+    date, media and body extraction off the same tree. The body comes from
+    the cheapest tier that passes its quality check (extract_body_tiered),
+    else from readability; extraction_tier says which. tiered=False always
+    uses readability, metadata_only skips the body altogether. Stage
+    durations go to timer (a StageTimer), if given.
+    """
+    from readability import Document
+    from readability.htmls import get_title
+
+    timer = timer or StageTimer()
+    tree = parse_html(html_content)
+    timer.lap("parse")
+
+    # Metadata first: readability drops hidden nodes from the tree it is given
+    pub_date = extract_date_from_tree(tree, url)
+    timer.lap("date")
+
+    # Media Extraction
+    image_url = None
+    video_urls = []
+    if extract_media:
+        image_url, video_urls = extract_media_from_tree(tree)
+        timer.lap("media")
+
+    if metadata_only:
+        markdown, tier = "", "metadata"
+        title = get_title(tree)
+    else:
+        markdown, tier = extract_body_tiered(tree) if tiered else (None, None)
+        timer.lap("extract")
+        if markdown is not None:
+            title = get_title(tree)
+        else:
+            # Readability extraction (works on its own deep copy of the tree)
+            doc = Document(tree)
+            title = doc.title()
+            summary_html = doc.summary()
+            timer.lap("readability")
+
+            # HTML to Markdown
+            markdown, tier = make_html2text().handle(summary_html), "readability"
+            timer.lap("markdown")
+
+    return {
+        "full_content": markdown,
+        "extraction_tier": tier,
+        "extracted_date": pub_date.isoformat() if pub_date else None,
+        "extracted_title": title,
+        "image_url": image_url,
+        "video_urls": video_urls,
+        "status": "success"
+    }
+
+def content_fingerprint(markdown):
+    """
+    64-bit SimHash of the word 3-shingles of markdown, as 16 hex digits, or
+    None for pages under SIMHASH_MIN_WORDS words. Link targets are ignored,
+    since each outlet points them at its own site. Cost is bounded: only
+    the first SIMHASH_MAX_CHARS are read and SIMHASH_SAMPLE shingles vote,
+    picked by hash value so that both copies of a story pick the same ones.
+    """
+    words = re.findall(r'\w+', re.sub(r'\]\([^)]*\)', ']', (markdown or "")[:SIMHASH_MAX_CHARS]).lower())
+    if len(words) < SIMHASH_MIN_WORDS:
+        return None
+    # Fingerprints are cached for days, so everything is hashed the same on
+    # every interpreter and platform (hash() is not): a shingle is the
+    # little-endian CRC-32s of its words, the sample is picked by CRC-32 and
+    # each sampled shingle votes with a 64-bit BLAKE2b
+    ids = struct.pack(f"<{len(words)}I", *map(zlib.crc32, map(str.encode, words)))
+    width = 4 * SIMHASH_SHINGLE
+    shingles = {ids[i:i + width] for i in range(0, len(ids) - width + 4, 4)}
+    sample = heapq.nsmallest(SIMHASH_SAMPLE, zip(map(zlib.crc32, shingles), shingles))
+    hashes = [hashlib.blake2b(shingle, digest_size=8).digest() for _, shingle in sample]
+    # Each bit is set if most shingle hashes have it set
+    half = len(hashes) / 2
+    columns = zip(*(f"{int.from_bytes(h, 'big'):064b}" for h in hashes))
+    fingerprint = int("".join("1" if column.count("1") > half else "0" for column in columns), 2)
+    return f"{fingerprint:016x}"
+
+def fingerprint_distance(a, b):
+    """Number of differing bits between two content_fingerprint values."""
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+def _page_encoding(response, head):
+    """Charset from the Content-Type header, else from a <meta> in the first bytes, else UTF-8."""
+    match = re.search(r'charset=["\']?([\w-]+)', response.headers.get('Content-Type', ''), re.I)
+    if match:
+        encoding = match.group(1)
+    else:
+        match = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', bytes(head[:4096]), re.I)
+        encoding = match.group(1).decode('ascii') if match else 'utf-8'
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = 'utf-8'
+    return encoding
+
+def fetch_page(response, max_bytes=MAX_PAGE_BYTES, metadata_only=False):
+    """
+    Reads a streamed (stream=True) response with bounded memory and bandwidth.
+    Aborts early on a non-HTML Content-Type or a binary-looking body, stops
+    reading at max_bytes, and in metadata_only mode stops METADATA_BODY_BYTES
+    past </head>. Returns (text, truncated).
+    """
+    try:
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type and content_type not in HTML_CONTENT_TYPES:
+            raise ValueError(f"Unsupported content type: {content_type}")
+
+        body = bytearray()
+        head_end = -1
+        truncated = False
+        for chunk in response.iter_content(chunk_size=16384):
+            if not body and (chunk.startswith(b'%PDF') or b'\x00' in chunk[:1024]):
+                raise ValueError("Unsupported content: binary data")
+            body += chunk
+
+            if len(body) >= max_bytes:
+                del body[max_bytes:]
+                truncated = True
+                break
+            if metadata_only:
+                if head_end < 0:
+                    # Only the new chunk (and a tag split across chunks) is searched
+                    start = max(0, len(body) - len(chunk) - 6)
+                    found = bytes(body[start:]).lower().find(b'</head')
+                    head_end = start + found if found >= 0 else -1
+                if head_end >= 0 and len(body) - head_end >= METADATA_BODY_BYTES:
+                    truncated = True
+                    break
+
+        return bytes(body).decode(_page_encoding(response, body), errors='replace'), truncated
+    finally:
+        # Releases the connection, or drops it if the body was not fully read
+        response.close()
+
+def failure_kind(exc):
+    """Classifies a deep-dive exception into a NEGATIVE_TTL_HOURS key."""
+    import requests
+
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        code = exc.response.status_code
+        if code in (404, 410):
+            return "not_found"
+        if code in (401, 402, 403, 451):
+            return "forbidden"
+        if code == 429:
+            return "rate_limited"
+        if code >= 500:
+            return "server_error"
+    elif isinstance(exc, requests.Timeout):
+        return "timeout"
+    elif isinstance(exc, requests.ConnectionError):
+        return "connection"
+    elif isinstance(exc, ValueError) and str(exc).startswith("Unsupported content"):
+        return "unsupported"
+    return "error"
+
+def process_deep_dive(url, session=None, extract_media=False, page_cache=None, throttle=None,
+                      max_bytes=MAX_PAGE_BYTES, metadata_only=False, timer=None, timeout=DIVE_TIMEOUT,
+                      fingerprint=True):
+    """
+    Fetches URL, extracts main content as Markdown (see extract_page).
+    Returns dict with content, author, date, etc.
+    With a page_cache, fresh pages are served without any request and stale
+    ones are revalidated conditionally (ETag / Last-Modified).
+    Downloads are streamed and bounded (see fetch_page). fingerprint=False
+    skips the near-duplicate fingerprint of new extractions.
+    Stage durations go to timer (a StageTimer), if given.
+    """
+    import requests
+
+    timer = timer or StageTimer()
+    try:
+        cache_key = normalize_url(url)
+        cached = page_cache.lookup(cache_key) if page_cache else None
+        timer.lap("cache_lookup")
+        if cached and cached['fresh']:
+            return dict(cached['data'], page_cache="hit")
+
+        headers = get_random_header_dict()
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        # Politeness only applies to requests that actually go out
+        if throttle:
+            throttle.wait(url)
+            timer.lap("wait")
+
+        # Use provided session or create a new one
+        _active_timer.timer = timer
+        try:
+            if session:
+                response = session.get(url, headers=headers, timeout=timeout, stream=True)
+            else:
+                response = requests.get(url, headers=headers, timeout=timeout, stream=True)
+        finally:
+            _active_timer.timer = None
+        # Headers received; new connections' dns / connect are recorded apart
+        timer.lap("ttfb")
+
+        if cached and response.status_code == 304:
+            response.close()
+            page_cache.revalidated(cache_key)
+            return dict(cached['data'], page_cache="revalidated")
+
+        if response.status_code >= 400:
+            response.close()
+        response.raise_for_status()
+
+        html_content, truncated = fetch_page(response, max_bytes=max_bytes, metadata_only=metadata_only)
+        timer.lap("download")
+
+        # A byte-identical page (mirror, re-download without validators) reuses its extraction
+        digest = hashlib.sha1(html_content.encode('utf-8', 'replace')).hexdigest()
+        known = page_cache.find_digest(digest) if page_cache else None
+        if known:
+            data = {k: v for k, v in known.items() if k not in ('truncated', 'final_url', 'page_cache')}
+        else:
+            # Cached entries always carry media so any later --media run can use them
+            data = extract_page(html_content, url, extract_media=extract_media or page_cache is not None, timer=timer,
+                                metadata_only=metadata_only)
+            if fingerprint:
+                data['fingerprint'] = content_fingerprint(data['full_content'])
+                data['fingerprint_version'] = SIMHASH_VERSION
+                timer.lap("fingerprint")
+        if truncated:
+            data['truncated'] = True
+        final_key = normalize_url(response.url)
+        if final_key != cache_key:
+            data['final_url'] = response.url
+        # Metadata-only reads are partial pages with no body: not worth caching
+        if page_cache and not metadata_only:
+            # Also cached under the redirect target, which other queries may return directly
+            for key in {cache_key, final_key}:
+                page_cache.put(key, data,
+                               etag=response.headers.get('ETag'),
+                               last_modified=response.headers.get('Last-Modified'),
+                               digest=digest)
+            data['page_cache'] = "digest" if known else "miss"
+            timer.lap("cache_store")
+        return data
+    except Exception as e:
+        return {
+            "full_content": "",
+            "error": str(e),
+            "failure": failure_kind(e),
+            "status": "error"
+        }
+
+def deep_dive_result(res, args, session, throttle, page_cache=None, local_index=None, timer=None, failures=None):
+    """
+    Runs the deep dive for a single search result, updating it in place.
+    Successful pages are added to local_index, if given. Failed and empty
+    pages are recorded in failures (a FailureMemory), if given. Stage
+    durations go to timer (a StageTimer), if given.
+    """
+    from dateutil import parser as date_parser
+
+    timer = timer or StageTimer()
+    try:
+        print(f"Deep diving into: {res['url']}", file=sys.stderr)
+        # Politeness jitter is per host, so different hosts don't wait on each other
+        data = process_deep_dive(res['url'], session=session, extract_media=args.media,
+                                 page_cache=page_cache, throttle=throttle, max_bytes=args.max_bytes, timer=timer,
+                                 metadata_only=args.metadata_only, fingerprint=args.count > 1,
+                                 timeout=failures.timeout_for(res['url']) if failures else DIVE_TIMEOUT)
+        timer.page_cache = data.get('page_cache')
+
+        if failures and data.get('page_cache') != "hit":
+            if data['status'] != 'success':
+                failures.failed(res['url'], data.get('failure', "error"))
+            elif not args.metadata_only and len(data['full_content'].strip()) < NEGATIVE_MIN_CONTENT_CHARS:
+                failures.failed(res['url'], "empty")
+            else:
+                failures.succeeded(res['url'])
+
+        if data['status'] == 'success':
+            res['extracted_date'] = data.get('extracted_date')
+            res['deep_dive_status'] = "success"
+            if data.get('final_url'):
+                res['final_url'] = data['final_url']
+            if args.metadata_only:
+                # Page cache hits may carry a body; metadata-only results never do
+                res['extraction_tier'] = "metadata"
+            else:
+                res['deep_content'] = data['full_content']
+                if data.get('extraction_tier'):
+                    res['extraction_tier'] = data['extraction_tier']
+                if data.get('truncated'):
+                    res['truncated'] = True
+                # Only needed to collapse near-duplicates, so never for a single result
+                if args.count > 1:
+                    # Pages cached without a current one get it now
+                    if data.get('fingerprint_version') == SIMHASH_VERSION:
+                        res['fingerprint'] = data['fingerprint']
+                    else:
+                        res['fingerprint'] = content_fingerprint(data['full_content'])
+                fetched = data.get('page_cache') not in ("hit", "revalidated")
+                if local_index and data['full_content'] and (fetched or local_index.needs_indexing(res['url'])):
+                    local_index.add(res['url'], data.get('extracted_title') or res.get('title'),
+                                    data.get('extracted_date'), data['full_content'])
+                    timer.lap("local_index")
+
+            if args.media:
+                res['image_url'] = data.get('image_url')
+                res['video_urls'] = data.get('video_urls')
+
+            # Post-fetch Date Filter Check
+            if args.time and data.get('extracted_date'):
+                try:
+                    dt = date_parser.parse(data['extracted_date'])
+                    if not is_date_relevant(dt, args.time):
+                        res['filtered_out'] = True
+                        res['filter_reason'] = f"Date {dt} outside range {args.time}"
+                except:
+                    pass
+        else:
+            res['deep_dive_status'] = "failed"
+            res['error'] = data.get('error')
+            # Soft fallback: keep the result but without deep content
+
+    except Exception as e:
+        res['deep_dive_status'] = "error"
+        res['error'] = str(e)
+    return res
+
+# --- Passage Ranking ---
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+def split_passages(markdown):
+    """Splits markdown into passages of roughly PASSAGE_MIN_CHARS..PASSAGE_MAX_CHARS, in page order."""
+    passages = []
+    current = ""
+    for block in re.split(r'\n\s*\n', markdown or ""):
+        block = block.strip()
+        if not block:
+            continue
+        current = f"{current}\n\n{block}" if current else block
+        # Headings and short blocks stay attached to what follows
+        if len(current) < PASSAGE_MIN_CHARS or block.startswith('#'):
+            continue
+        while len(current) > PASSAGE_MAX_CHARS:
+            cut = current.rfind('. ', PASSAGE_MIN_CHARS, PASSAGE_MAX_CHARS) + 1 or PASSAGE_MAX_CHARS
+            passages.append(current[:cut].strip())
+            current = current[cut:].strip()
+        if current:
+            passages.append(current)
+        current = ""
+    if current:
+        passages.append(current)
+    return passages
+
+def bm25_scores(query, passages):
+    """BM25 score of each passage against query, with IDF taken over these passages."""
+    terms = set(tokenize(query))
+    docs = [tokenize(p) for p in passages]
+    if not terms or not docs:
+        return [0.0] * len(passages)
+    avg_len = sum(len(d) for d in docs) / len(docs) or 1
+    counts = []
+    df = dict.fromkeys(terms, 0)
+    for doc in docs:
+        tf = {}
+        for word in doc:
+            if word in terms:
+                tf[word] = tf.get(word, 0) + 1
+        counts.append(tf)
+        for word in tf:
+            df[word] += 1
+    idf = {t: math.log(1 + (len(docs) - df[t] + 0.5) / (df[t] + 0.5)) for t in terms}
+    scores = []
+    for doc, tf in zip(docs, counts):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(doc) / avg_len)
+        scores.append(sum(idf[t] * n * (BM25_K1 + 1) / (n + norm) for t, n in tf.items()))
+    return scores
+
+def truncate_passage(text, limit):
+    """text cut to at most limit chars, at a word boundary where possible."""
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(' ', 0, limit)
+    return text[:cut if cut > 0 else limit].rstrip()
+
+def render_passages(passages, chosen, texts=None):
+    """Chosen passage indexes joined in page order, with PASSAGE_GAP where text was cut; texts overrides passages."""
+    texts = texts or {}
+    chunks = []
+    previous = -1
+    for p in sorted(chosen):
+        if p != previous + 1:
+            chunks.append(PASSAGE_GAP)
+        chunks.append(texts.get(p, passages[p]))
+        previous = p
+    if chunks and (previous != len(passages) - 1 or previous in texts):
+        chunks.append(PASSAGE_GAP)
+    return "\n\n".join(chunks)
+
+def apply_budget(results, query, budget_chars):
+    """
+    --budget: replaces each result's deep_content, in place, by its
+    passages that rank best against query, so that all deep_content
+    together stays within budget_chars. Every result first gets its best
+    passage, shortened if an even share of what is left cannot hold it
+    whole (it is empty only if the budget cannot hold the PASSAGE_GAP
+    markers), then the remaining budget goes to the best passages overall.
+    Kept passages stay in page order, with PASSAGE_GAP where text was cut;
+    full_content_chars records the original length.
+    """
+    pages = [(res, split_passages(res['deep_content'])) for res in results if res.get('deep_content')]
+    flat = [(r, p) for r, (_, passages) in enumerate(pages) for p in range(len(passages))]
+    scores = bm25_scores(query, [pages[r][1][p] for r, p in flat])
+    ranked = sorted(zip(scores, flat), key=lambda item: (-item[0], item[1]))
+
+    best = {}
+    for _, (r, p) in ranked:
+        best.setdefault(r, p)
+
+    chosen = {r: set() for r in range(len(pages))}
+    shortened = {}  # r -> {p: shortened text of its best passage}
+    sizes = dict.fromkeys(range(len(pages)), 0)
+    used = 0
+    # Shortest best passages first, so what they leave of their share goes to the longer ones
+    reserve = sorted(best.items(), key=lambda item: len(pages[item[0]][1][item[1]]))
+    for left, (r, p) in enumerate(reserve):
+        passages = pages[r][1]
+        share = (budget_chars - used) // (len(reserve) - left)
+        content = render_passages(passages, {p})
+        if len(content) > share:
+            overhead = len(render_passages(passages, {p}, {p: ""}))
+            if share - overhead <= 0:
+                continue
+            shortened[r] = {p: truncate_passage(passages[p], share - overhead)}
+            content = render_passages(passages, {p}, shortened[r])
+        chosen[r].add(p)
+        sizes[r] = len(content)
+        used += sizes[r]
+
+    # Passages sharing no term with the query only fill a budget as a result's best passage
+    for score, (r, p) in ranked:
+        if score <= 0 or p in chosen[r] or r in shortened:
+            continue
+        size = len(render_passages(pages[r][1], chosen[r] | {p}))
+        if used + size - sizes[r] <= budget_chars:
+            chosen[r].add(p)
+            used += size - sizes[r]
+            sizes[r] = size
+
+    for r, (res, passages) in enumerate(pages):
+        res['full_content_chars'] = len(res['deep_content'])
+        res['deep_content'] = render_passages(passages, chosen[r], shortened.get(r))
+    return results
+
+# --- Provider Rate Limiting ---
+
+class ProviderUnavailable(Exception):
+    pass
+
+class AdaptiveRateLimiter(CacheDB):
+    """
+    Token-bucket rate limiter with adaptive backoff and a circuit breaker,
+    persisted in the cache DB so every process (CLI runs, batch, server)
+    shares one budget per provider.
+    Clean responses speed the rate up; a challenge cuts it sharply and trips
+    the breaker, which makes acquire() fail fast for a cooldown window that
+    doubles with each consecutive trip.
+    """
+    def __init__(self, name, rate=DDG_RATE_INITIAL, min_rate=DDG_RATE_MIN, max_rate=DDG_RATE_MAX,
+                 burst=DDG_BURST, path=CACHE_DB):
+        self.name = name
+        self.initial_rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        super().__init__(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS provider_state (
+                name TEXT PRIMARY KEY,
+                rate REAL NOT NULL,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                failures INTEGER NOT NULL,
+                open_until REAL NOT NULL
+            )
+        """)
+
+    def _update(self, change):
+        """Runs change(state, now) -> state on the stored state in one transaction."""
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT rate, tokens, updated, failures, open_until FROM provider_state WHERE name = ?",
+                (self.name,)).fetchone()
+            state = dict(zip(("rate", "tokens", "updated", "failures", "open_until"), row)) if row else \
+                {"rate": self.initial_rate, "tokens": self.burst, "updated": now, "failures": 0, "open_until": 0.0}
+            # Refill
+            state["tokens"] = min(self.burst, state["tokens"] + max(0.0, now - state["updated"]) * state["rate"])
+            state["updated"] = now
+            result = change(state, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO provider_state (name, rate, tokens, updated, failures, open_until) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.name, state["rate"], state["tokens"], state["updated"], state["failures"], state["open_until"]))
+        return result
+
+    def acquire(self):
+        """Waits for a token. Raises ProviderUnavailable while the breaker is open."""
+        def take(state, now):
+            if state["open_until"] > now:
+                raise ProviderUnavailable(f"{self.name} circuit open for {state['open_until'] - now:.0f}s")
+            # Reserve a token now (tokens may go negative) so concurrent callers queue up behind it
+            state["tokens"] -= 1
+            return 0.0 if state["tokens"] >= 0 else -state["tokens"] / state["rate"]
+
+        delay = self._update(take)
+        if delay > 0:
+            # A little jitter so the spacing doesn't look mechanical
+            time.sleep(delay + random.uniform(0, 0.25 * delay))
+
+    def success(self):
+        def reward(state, now):
+            state["rate"] = min(self.max_rate, state["rate"] * RATE_SPEEDUP)
+            state["failures"] = 0
+        self._update(reward)
+
+    def challenged(self):
+        def penalize(state, now):
+            state["rate"] = max(self.min_rate, state["rate"] / RATE_BACKOFF)
+            state["failures"] += 1
+            cooldown = min(BREAKER_MAX_COOLDOWN, BREAKER_COOLDOWN * 2 ** (state["failures"] - 1))
+            state["open_until"] = now + cooldown
+            state["tokens"] = min(state["tokens"], 0.0)
+            sys.stderr.write(f"DEBUG: {self.name} challenged, rate {state['rate']:.2f}/s, skipped for {cooldown:.0f}s\n")
+        self._update(penalize)
+
+# --- Search Providers ---
+
+_search_local = threading.local()  # on_request: set by search_hedged in the threads it runs providers in
+
+def request_started():
+    """
+    Providers call this right before their first request actually goes
+    out, i.e. after any provider slot or rate limit wait, so the hedge
+    deadline (see search_hedged) only counts time spent on the network.
+    """
+    on_request = getattr(_search_local, "on_request", None)
+    if on_request:
+        on_request()
+
+class SearchProvider:
+    def search(self, query, count=5, time_filter=None, on_page=None, fast=False):
+        """
+        Returns up to count results. With on_page, the new results of each
+        page are also passed to it as soon as that page arrives. fast
+        selects a cheaper results parser where the provider has one.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def add_page(results, page, count, on_page=None):
+        """
+        Appends page results not already seen on earlier pages (up to count).
+        Result URLs are canonicalized here (redirect wrappers, tracking).
+        """
+        seen = {normalize_url(r['url']) for r in results}
+        new = []
+        for res in page:
+            if len(results) + len(new) >= count:
+                break
+            res['url'] = canonical_url(res['url'])
+            key = normalize_url(res['url'])
+            if key not in seen:
+                seen.add(key)
+                new.append(res)
+        results.extend(new)
+        if on_page and new:
+            on_page(new)
+        return new
+
+class DDGLiteProvider(SearchProvider):
+    url = "https://lite.duckduckgo.com/lite/"  # Overridden by bench/bench_offline.py
+
+    def __init__(self):
+        import requests
+
+        self.session = requests.Session()
+        self.session.headers.update(get_random_header_dict())
+        # Shared by every search and process, so DDG queries are paced globally
+        self.limiter = AdaptiveRateLimiter("ddg")
+
+    def search(self, query, count=5, time_filter=None, on_page=None, fast=False):
+        # DDG Lite: 'q' is query, 'kl' is region
+        payload = {'q': query, 'kl': 'us-en'}
+        
+        # DDG Lite supports 'df' param: d (day), w (week), m (month), y (year)
+        if time_filter:
+            payload['df'] = time_filter
+
+        # Each page's offsets come from the previous page's "Next Page" form,
+        # so pages are fetched in turn; on_page lets deep dives start meanwhile.
+        results = []
+        for page in range(DDG_MAX_PAGES):
+            try:
+                output = self.fetch(payload)
+                parsed = self.parse_results_fast(output) if fast else None
+                # Markup the regexes don't understand falls back to the full parse
+                page_results, next_payload = parsed if parsed and parsed[0] else self.parse_results(output)
+            except Exception as e:
+                if page == 0:
+                    raise
+                sys.stderr.write(f"DEBUG: DDG Lite page {page + 1} failed: {e}\n")
+                break
+
+            self.add_page(results, page_results, count, on_page)
+            if len(results) >= count or not page_results or not next_payload:
+                break
+            payload = next_payload
+            if time_filter:
+                payload.setdefault('df', time_filter)
+
+        return results
+
+    def fetch(self, payload):
+        # Waits for the shared rate limit; fails fast while the breaker is open
+        self.limiter.acquire()
+        request_started()
+        
+        # Using session post
+        resp = self.session.post(self.url, data=payload, timeout=15)
+        if resp.status_code in (403, 429):
+            self.limiter.challenged()
+        resp.raise_for_status()
+        
+        output = resp.text
+        
+        # DEBUG: Save output for inspection if empty
+        # with open("debug_ddg_response.html", "w") as f: f.write(output)
+
+        if "anomaly-modal" in output or "challenge-form" in output:
+            self.limiter.challenged()
+            raise Exception("DDG Rate Limit / Bot Detection")
+        self.limiter.success()
+        return output
+
+    @staticmethod
+    def parse_results(output):
+        """Returns (results, next_page_payload or None) for a DDG Lite results page."""
+        from bs4 import BeautifulSoup
+
+        results = []
+        
+        # Use BeautifulSoup instead of regex for robustness
+        soup = BeautifulSoup(output, 'lxml')
+        
+        # DDG Lite structure: table with rows
+        # Each result is typically 3-4 rows:
+        # 1. Link title (class='result-link')
+        # 2. Snippet (class='result-snippet')
+        # 3. URL/metadata
+        
+        links = soup.find_all('a', class_='result-link')
+        snippets = soup.find_all('td', class_='result-snippet')
+        
+        # They should align by index
+        for i, link in enumerate(links):
+            title = link.get_text().strip()
+            href = link.get('href')
+            
+            snippet = ""
+            if i < len(snippets):
+                snippet = snippets[i].get_text().strip()
+            
+            if title and href:
+                results.append({
+                    "title": title,
+                    "url": href,
+                    "snippet": snippet,
+                    "source": "ddg_lite"
+                })
+
+        # Pagination: the form holding the "Next Page" button carries the offsets
+        next_payload = None
+        for form in soup.find_all('form'):
+            if form.find('input', attrs={'type': 'submit', 'value': re.compile('Next', re.I)}):
+                next_payload = {
+                    field['name']: field.get('value', '')
+                    for field in form.find_all('input', attrs={'type': 'hidden'}) if field.get('name')
+                }
+                break
+
+        return results, next_payload or None
+
+    @staticmethod
+    def parse_results_fast(output):
+        """
+        parse_results with regexes over the raw page instead of a
+        BeautifulSoup tree (--fast): same results for DDG Lite's markup,
+        an empty list if the markup changed.
+        """
+        def text(fragment):
+            return html.unescape(re.sub(r'<[^>]+>', '', fragment)).strip()
+
+        def attributes(tag):
+            return {m.group(1).lower(): html.unescape(next(v for v in m.groups()[1:] if v is not None))
+                    for m in re.finditer(HTML_ATTR_PATTERN, tag)}
+
+        snippets = [text(m.group(1)) for m in re.finditer(DDG_SNIPPET_PATTERN, output)]
+        results = []
+        for i, match in enumerate(re.finditer(DDG_LINK_PATTERN, output)):
+            title = text(match.group(2))
+            href = attributes(match.group(1)).get('href')
+            if title and href:
+                results.append({
+                    "title": title,
+                    "url": href,
+                    "snippet": snippets[i] if i < len(snippets) else "",
+                    "source": "ddg_lite"
+                })
+
+        next_payload = None
+        for form in re.finditer(DDG_FORM_PATTERN, output):
+            inputs = [attributes(m.group(1)) for m in re.finditer(HTML_INPUT_PATTERN, form.group(1))]
+            if any(field.get('type', '').lower() == 'submit' and re.search('(?i)Next', field.get('value', ''))
+                   for field in inputs):
+                next_payload = {
+                    field['name']: field.get('value', '')
+                    for field in inputs if field.get('type', '').lower() == 'hidden' and field.get('name')
+                }
+                break
+
+        return results, next_payload or None
+
+class GoogleCustomSearchProvider(SearchProvider):
+    url = "https://www.googleapis.com/customsearch/v1"  # Overridden by bench/bench_offline.py
+
+    def __init__(self, api_key, cx):
+        import requests
+
+        self.api_key = api_key
+        self.cx = cx
+        self.session = requests.Session()
+
+    def search(self, query, count=5, time_filter=None, on_page=None, fast=False):
+        from concurrent.futures import ThreadPoolExecutor
+
+        if not self.api_key or not self.cx:
+            raise Exception("Google API Key or CX missing")
+        request_started()
+
+        # Google API max is 10 per page and 100 overall; pages are fetched
+        # concurrently and handed over in order
+        starts = list(range(1, min(count, GOOGLE_MAX_RESULTS) + 1, 10))
+        results = []
+        with ThreadPoolExecutor(max_workers=len(starts)) as pool:
+            pages = [pool.submit(self.fetch_page, query, start, min(10, count - start + 1), time_filter) for start in starts]
+            for number, future in enumerate(pages):
+                try:
+                    page_results = future.result()
+                except Exception as e:
+                    if number == 0:
+                        raise
+                    sys.stderr.write(f"DEBUG: Google CSE page {number + 1} failed: {e}\n")
+                    break
+                self.add_page(results, page_results, count, on_page)
+                if len(page_results) < 10:
+                    break # Last page
+        return results
+
+    def fetch_page(self, query, start, num, time_filter=None):
+        params = {
+            'q': query,
+            'key': self.api_key,
+            'cx': self.cx,
+            'num': num,
+            'start': start
+        }
+        
+        if time_filter:
+            # Google dateRestrict: d[number], w[number], m[number]
+            # Map simplified time_filter to Google format
+            mapping = {'d': 'd1', 'w': 'w1', 'm': 'm1', 'y': 'y1'}
+            if time_filter in mapping:
+                params['dateRestrict'] = mapping[time_filter]
+
+        resp = self.session.get(self.url, params=params, timeout=15)
+        resp.raise_for_status()
+        data = resp.json()
+        
+        results = []
+        if 'items' in data:
+            for item in data['items']:
+                results.append({
+                    "title": item.get('title'),
+                    "url": item.get('link'),
+                    "snippet": item.get('snippet'),
+                    "source": "google_cse"
+                })
+        return results
+
+class LocalIndexProvider(SearchProvider):
+    """Answers from the local index of deep-dived pages, with no network."""
+    def __init__(self, index):
+        self.index = index
+
+    def search(self, query, count=5, time_filter=None, on_page=None, fast=False):
+        request_started()
+        return self.add_page([], self.index.search(query, count, time_filter), count, on_page)
+
+# --- Main Logic ---
+
+class SearchContext:
+    """
+    Long-lived state shared by searches: providers (and their sessions), the
+    deep-dive session and its per-host throttle, and the cache stores. The CLI
+    builds one per run; server mode keeps one warm for its whole lifetime.
+    Providers and sessions are created on first use, so a cache hit never
+    imports requests.
+    """
+    def __init__(self):
+        self.throttle = HostThrottle()
+        self.provider_slots = {name: threading.BoundedSemaphore(n) for name, n in PROVIDER_CONCURRENCY.items()}
+        self._lock = threading.Lock()
+        self._ddg = None
+        self._google = None
+        self._google_loaded = False
+        self._local = None
+        self._dive_session = None
+        self._dive_pool_size = 0
+        self._preconnect_pool = None
+        self._warmed = {}   # scheme://host:port -> time of its last warm-up
+        self.profiler = None  # A RunProfiler with --profile
+
+    @property
+    def ddg(self):
+        with self._lock:
+            if self._ddg is None:
+                self._ddg = DDGLiteProvider()
+            return self._ddg
+
+    @property
+    def google(self):
+        with self._lock:
+            if not self._google_loaded:
+                # Try to load Google Config from env or file
+                google_key = os.environ.get("GOOGLE_API_KEY")
+                google_cx = os.environ.get("GOOGLE_CX")
+                if google_key and google_cx:
+                    self._google = GoogleCustomSearchProvider(google_key, google_cx)
+                self._google_loaded = True
+            return self._google
+
+    @property
+    def local(self):
+        with self._lock:
+            if self._local is None:
+                self._local = LocalIndexProvider(get_local_index())
+            return self._local
+
+    @property
+    def dive_session(self):
+        import requests
+
+        with self._lock:
+            if self._dive_session is None:
+                install_connection_hook()
+                # Use a shared session for deep dives to reuse connection pool
+                self._dive_session = requests.Session()
+            return self._dive_session
+
+    def size_dive_pool(self, concurrency):
+        """Gives dive_session per-host pools of at least concurrency connections."""
+        from requests.adapters import HTTPAdapter
+
+        session = self.dive_session
+        with self._lock:
+            if concurrency > self._dive_pool_size:
+                for prefix in ("http://", "https://"):
+                    session.mount(prefix, HTTPAdapter(pool_connections=DIVE_POOL_HOSTS, pool_maxsize=concurrency))
+                self._dive_pool_size = concurrency
+
+    def preconnect(self, url):
+        """Warms a dive_session connection to url's host in the background (see preconnect)."""
+        parts = urllib.parse.urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}".lower()
+        session = self.dive_session
+        with self._lock:
+            now = time.monotonic()
+            if now - self._warmed.get(origin, -PRECONNECT_IDLE) < PRECONNECT_IDLE:
+                return
+            self._warmed[origin] = now
+            if self._preconnect_pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._preconnect_pool = ThreadPoolExecutor(max_workers=PRECONNECT_WORKERS, thread_name_prefix="preconnect")
+        self._preconnect_pool.submit(preconnect, session, url)
+
+    def call(self, fn, *args, **kwargs):
+        """Runs fn, under the --profile profiler if one is attached."""
+        if self.profiler:
+            return self.profiler.call(fn, *args, **kwargs)
+        return fn(*args, **kwargs)
+
+    def provider_slot(self, provider):
+        """Semaphore bounding concurrent searches on provider."""
+        return self.provider_slots.setdefault(provider.__class__.__name__, threading.BoundedSemaphore(1))
+
+def search_count(args):
+    """
+    Hits to ask providers for. With --time and --deep, some results are
+    dropped by the date filters, so args.overfetch times more candidates are
+    requested and the pipeline only dives as many as are needed.
+    """
+    if args.time and args.deep:
+        return max(args.count, math.ceil(args.count * args.overfetch))
+    return args.count
+
+def run_provider(provider, query, args, ctx, on_page=None):
+    with ctx.provider_slot(provider):
+        return provider.search(query, count=search_count(args), time_filter=args.time, on_page=on_page, fast=args.fast)
+
+def merge_provider_results(answers, count):
+    """Interleaves ranked result lists (first provider first), dropping duplicate URLs."""
+    merged = []
+    seen = set()
+    for rank in range(max(len(results) for results in answers)):
+        for results in answers:
+            if rank < len(results):
+                key = normalize_url(results[rank]['url'])
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(results[rank])
+    return merged[:count]
+
+def search_hedged(providers, query, args, ctx):
+    """
+    Hedged failover: providers run in order, but the next one is fired as
+    soon as the current one fails, answers empty, or is still running
+    args.hedge_after seconds after its request went out (time queued for a
+    provider slot or rate limit does not count, see request_started). The
+    first non-empty answer wins; with args.merge_providers every provider
+    is awaited and the answers merged. Losing searches finish in daemon
+    threads and are ignored. Returns (results, provider_name).
+    """
+    # (provider, results, error); results None means the provider's request just went out
+    answers = queue.Queue()
+
+    def run(provider):
+        _search_local.on_request = lambda: answers.put((provider, None, None))
+        try:
+            answers.put((provider, run_provider(provider, query, args, ctx), None))
+        except Exception as e:
+            answers.put((provider, [], e))
+
+    def launch(provider):
+        threading.Thread(target=run, args=(provider,), daemon=True).start()
+
+    launch(providers[0])
+    launched, running = 1, 1
+    deadline = None  # Set once the latest provider's request is out
+    started = set()
+    good = {}
+
+    while running or launched < len(providers):
+        if launched < len(providers) and (running == 0 or (deadline is not None and time.monotonic() >= deadline)):
+            if running:
+                sys.stderr.write(f"DEBUG: Hedging with {providers[launched].__class__.__name__} after {args.hedge_after}s\n")
+            launch(providers[launched])
+            launched += 1
+            running += 1
+            deadline = None
+            continue
+
+        timeout = max(0, deadline - time.monotonic()) if launched < len(providers) and deadline is not None else None
+        try:
+            provider, results, error = answers.get(timeout=timeout)
+        except queue.Empty:
+            continue
+        if results is None and error is None:
+            # Only the first request of the latest provider starts its clock
+            if provider not in started:
+                started.add(provider)
+                if provider is providers[launched - 1]:
+                    deadline = time.monotonic() + args.hedge_after
+            continue
+        running -= 1
+
+        if error:
+            # Print to stderr so it doesn't break JSON stdout
+            sys.stderr.write(f"DEBUG: Provider {provider.__class__.__name__} failed: {error}\n")
+        if results:
+            good[provider] = results
+            if not args.merge_providers:
+                return results, provider.__class__.__name__
+
+    if not good:
+        return [], ""
+    ordered = [p for p in providers if p in good]
+    return merge_provider_results([good[p] for p in ordered], search_count(args)), "+".join(p.__class__.__name__ for p in ordered)
+
+class ResultPipeline:
+    """
+    Turns search hits into output results as they arrive: reuses results
+    from a smaller cached run, fills the citation fields, emits stream
+    records and queues deep dives on a bounded pool, so page-one results are
+    processed while later pages are still in flight. Provider order is kept.
+    With --time, clearly stale hits are dropped before any fetch, and only
+    as many dives run as can still fill args.count: further candidates wait
+    and replace results the date filters drop. Hits whose URL or domain
+    recently failed are kept without a dive (see FailureMemory); the hosts
+    of the others are connected to right away, while dives queue.
+    """
+    def __init__(self, args, ctx, reusable=None, emit=None):
+        self.args = args
+        self.ctx = ctx
+        self.reusable = reusable or {}
+        self.emit = emit
+        self.results = []
+        self.page_cache = get_page_cache() if args.cache else None
+        self.local_index = get_local_index() if args.cache else None
+        self.failures = get_failure_memory() if args.cache and args.deep else None
+        self._seen = set()
+        self._dived = {}    # Canonical URL (incl. redirect targets) -> result it belongs to
+        self._lock = threading.Condition()
+        self._pool = None
+        self._live = 0      # Results kept or still diving, i.e. not filtered out
+        self._pending = 0   # Dives submitted and not finished
+        self._waiting = deque()
+        if args.deep:
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(max_workers=args.concurrency)
+            ctx.size_dive_pool(args.concurrency)
+
+    def add(self, hits):
+        queued = []
+        with self._lock:
+            for res in hits:
+                key = normalize_url(res['url'])
+                if key in self._seen:
+                    continue
+                self._seen.add(key)
+                index = len(self.results)
+
+                # Results already present in a smaller cached run are reused as-is
+                if key in self.reusable:
+                    reused = self.reusable[key]
+                    self.results.append(reused)
+                    if not reused.get('filtered_out', False):
+                        self._live += 1
+                    self._emit_result(index, reused)
+                    continue
+                self.results.append(res)
+
+                # Normalize fields for Source Citation (Goal 3)
+                res['source_url'] = res.get('url')
+                res['source_title'] = res.get('title')
+
+                # Default status
+                res['deep_dive_status'] = "skipped"
+
+                # Local index hits already carry their page
+                if 'deep_content' in res:
+                    if self._pool:
+                        res['deep_dive_status'] = "success"
+                    else:
+                        del res['deep_content']
+                    self._live += 1
+                    self._emit_result(index, res)
+                    continue
+
+                if self._pool:
+                    # Pre-fetch date filter: no download for results that would be discarded anyway
+                    if self.args.time and prefilter_by_date(res, self.args.time):
+                        self._emit_result(index, res)
+                        continue
+                    # Known-bad URLs and failing domains are not fetched again, unless the
+                    # page cache can answer without a fetch (e.g. an "empty" page's extraction)
+                    cached = self.page_cache and self.page_cache.is_fresh(normalize_url(res['url']))
+                    reason = self.failures.skip_reason(res['url']) if self.failures and not cached else None
+                    if reason:
+                        res['skip_reason'] = reason
+                        self._live += 1
+                        self._emit_result(index, res)
+                        continue
+                    self._waiting.append((index, res))
+                    queued.append(res['url'])
+                else:
+                    self._live += 1
+                    self._emit_result(index, res)
+            self._schedule()
+
+        # Fresh cached pages need no connection
+        for url in queued:
+            if not (self.page_cache and self.page_cache.is_fresh(normalize_url(url))):
+                self.ctx.preconnect(url)
+
+    def _emit_result(self, index, res):
+        # With --budget, results are only final once every page is ranked (see emit_results)
+        if self.emit and not self.args.budget:
+            self.emit({"type": "result", "index": index, "result": res})
+
+    def emit_results(self, results):
+        """Emits the deferred --budget "result" records for results (as returned by finish)."""
+        if self.emit and self.args.budget:
+            kept = {id(res) for res in results}
+            for index, res in enumerate(self.results):
+                if id(res) in kept:
+                    self.emit({"type": "result", "index": index, "result": res})
+
+    def _schedule(self):
+        # Called with the lock held
+        while self._waiting and self._live < self.args.count:
+            index, res = self._waiting.popleft()
+            self._dived[normalize_url(res['url'])] = res
+            self._live += 1
+            self._pending += 1
+            if self.emit:
+                # Deep dive not done yet: no deep_dive_status to report
+                hit = {k: v for k, v in res.items() if k != 'deep_dive_status'}
+                self.emit({"type": "hit", "index": index, "result": hit})
+            self._pool.submit(self._dive, index, res)
+
+    def _dive(self, index, res):
+        timer = StageTimer()
+        try:
+            if self.args.head_check and self.args.time:
+                self._head_check(res)
+                timer.lap("head_check")
+            if not res.get('filtered_out', False):
+                self.ctx.call(deep_dive_result, res, self.args, self.ctx.dive_session, self.ctx.throttle,
+                              self.page_cache, self.local_index, timer, self.failures)
+            if self.args.timings:
+                res['timings'] = timer.as_dict()
+            if res.get('final_url'):
+                self._redirected(res)
+            self._emit_result(index, res)
+        except Exception as e:
+            # Nothing reads the pool's futures, so errors are reported on the result
+            res['deep_dive_status'] = "error"
+            res['error'] = str(e)
+            self._emit_result(index, res)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                if res.get('filtered_out', False):
+                    # Frees a slot for the next waiting candidate
+                    self._live -= 1
+                    self._schedule()
+                self._lock.notify_all()
+
+    def _redirected(self, res):
+        """Drops res if it redirected to a page another result already covers."""
+        with self._lock:
+            original = self._dived.setdefault(normalize_url(res['final_url']), res)
+        if original is not res and not res.get('filtered_out', False):
+            res['filtered_out'] = True
+            res['filter_reason'] = f"Duplicate of {original['url']} (redirect)"
+
+    def _collapse(self, kept):
+        """
+        Near-duplicate collapse, in provider order once every dive is done:
+        a result telling the same story as a higher-ranked one (e.g. one
+        wire article on several outlets) keeps its entry but drops its
+        deep_content in favour of a duplicate_of reference to it. Results
+        whose "result" record already went out are sent again.
+        """
+        primaries = []
+        kept_ids = {id(res) for res in kept}
+        for index, res in enumerate(self.results):
+            if id(res) not in kept_ids or not res.get('fingerprint') or res.get('duplicate_of'):
+                continue
+            for fingerprint, primary in primaries:
+                if fingerprint_distance(fingerprint, res['fingerprint']) <= SIMHASH_MAX_DISTANCE:
+                    res['duplicate_of'] = primary['url']
+                    res.pop('deep_content', None)
+                    self._emit_result(index, res)
+                    break
+            else:
+                primaries.append((res['fingerprint'], res))
+
+    def _head_check(self, res):
+        """--head-check: drops res before the GET if its Last-Modified is clearly stale."""
+        self.ctx.throttle.wait(res['url'])
+        last_modified = head_last_modified(res['url'], self.ctx.dive_session)
+        if last_modified and is_clearly_stale(last_modified.replace(tzinfo=None), self.args.time):
+            res['filtered_out'] = True
+            res['filter_reason'] = f"Pre-fetch: Last-Modified {last_modified} outside range {self.args.time}"
+
+    def finish(self):
+        """
+        Waits for pending deep dives; returns the results that were not
+        filtered out, in provider order, at most args.count of them, with
+        near-duplicates collapsed. Candidates that were never needed are
+        left out.
+        """
+        if self._pool:
+            with self._lock:
+                while self._pending:
+                    self._lock.wait()
+                unused = {id(res) for _, res in self._waiting}
+            self._pool.shutdown(wait=True)
+        else:
+            unused = set()
+        kept = [res for res in self.results if not res.get('filtered_out', False) and id(res) not in unused]
+        kept = kept[:self.args.count]
+        self._collapse(kept)
+        return kept
+
+class NDJSONWriter:
+    """Thread-safe writer of one JSON record per line, flushed immediately."""
+    def __init__(self, write=None, flush=None):
+        self.write = write or sys.stdout.write
+        self.flush = flush or sys.stdout.flush
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self.write(line)
+            self.flush()
+
+def summary_record(output):
+    """Final --stream record for a run_search output."""
+    record = {
+        "type": "summary",
+        "query": output.get("query"),
+        "count": output.get("count", 0),
+        "provider": output.get("provider"),
+        "cached": bool(output.get("cached", False))
+    }
+    if output.get("error"):
+        record["error"] = output["error"]
+    return record
+
+def budget_chars(args):
+    return args.budget * (CHARS_PER_TOKEN if args.budget_unit == "tokens" else 1)
+
+def run_search(args, ctx, emit=None):
+    """
+    Runs one search described by parsed CLI args and returns the output dict.
+    With emit, records are also streamed while the search runs: a "hit" per
+    search result as soon as the provider answers, then a "result" per
+    result as its deep dive completes (results needing no deep dive are
+    emitted as "result" straight away). With --budget, "result" records
+    follow once every page has been ranked.
+    With --timings, the output gets a "timings" summary (ms and cache
+    outcomes) and each deep-dived result its per-stage durations.
+    """
+    started = time.perf_counter()
+    query = " ".join(args.query)
+    
+    # 1. Check Cache
+    # Any cached run of the same query with at least this count can be sliced;
+    # a smaller one still saves the deep dives of the results it contains.
+    cache_key = get_cache_key(query, args)
+    partial_results = {}
+    # Local answers are instant and must not shadow live ones under the same key
+    use_cache = args.cache and args.provider != 'local'
+    if use_cache:
+        cached = get_cached_superset(query, args) or (get_cached_result(cache_key), args.count)
+        cached_data, cached_count = cached
+        if cached_data and cached_count >= args.count:
+            # Add metadata to indicate cached result
+            cached_data["results"] = cached_data["results"][:args.count]
+            cached_data["count"] = len(cached_data["results"])
+            cached_data["cached"] = True
+            if args.budget:
+                apply_budget(cached_data["results"], query, budget_chars(args))
+            if args.timings:
+                cached_data["timings"] = {"total": elapsed_ms(started), "query_cache": "hit"}
+            if emit:
+                for index, res in enumerate(cached_data["results"]):
+                    emit({"type": "result", "index": index, "result": res})
+            return cached_data
+        if cached_data:
+            partial_results = {normalize_url(r['url']): r for r in cached_data["results"]}
+
+    results = []
+    used_provider = ""
+
+    # Search Execution with Failover
+    providers_to_try = []
+    
+    if args.provider == 'ddg':
+        providers_to_try = [ctx.ddg]
+    elif args.provider == 'google':
+        if ctx.google: providers_to_try = [ctx.google]
+        else:
+            return {"error": "Google provider requested but no API key found."}
+    elif args.provider == 'local':
+        providers_to_try = [ctx.local]
+    else: # Auto
+        providers_to_try = [ctx.ddg]
+        if ctx.google:
+            providers_to_try.append(ctx.google)
+
+    pipeline = ResultPipeline(args, ctx, partial_results, emit)
+    # With a single provider, each page feeds the pipeline as soon as it arrives
+    # (blended results are interleaved once every source has answered)
+    blend = args.blend_local and args.provider != 'local'
+    on_page = pipeline.add if len(providers_to_try) == 1 and not blend else None
+
+    if len(providers_to_try) > 1 and args.hedge_after >= 0:
+        results, used_provider = search_hedged(providers_to_try, query, args, ctx)
+    else:
+        for p in providers_to_try:
+            try:
+                results = run_provider(p, query, args, ctx, on_page=on_page)
+                used_provider = p.__class__.__name__
+                if results: break
+            except Exception as e:
+                # Print to stderr so it doesn't break JSON stdout
+                sys.stderr.write(f"DEBUG: Provider {p.__class__.__name__} failed: {e}\n")
+                # import traceback
+                # traceback.print_exc(file=sys.stderr)
+                continue
+
+    if blend:
+        try:
+            local_hits = run_provider(ctx.local, query, args, ctx)
+        except Exception as e:
+            sys.stderr.write(f"DEBUG: Provider LocalIndexProvider failed: {e}\n")
+            local_hits = []
+        if local_hits and results:
+            results = merge_provider_results([results, local_hits], search_count(args))
+            used_provider += "+LocalIndexProvider"
+        elif local_hits:
+            results, used_provider = local_hits, "LocalIndexProvider"
+
+    if not results and partial_results:
+        # Provider failed, but the smaller cached run is still better than nothing
+        cached_data["cached"] = True
+        if args.budget:
+            apply_budget(cached_data["results"], query, budget_chars(args))
+        if args.timings:
+            cached_data["timings"] = {"total": elapsed_ms(started), "query_cache": "partial"}
+        if emit:
+            for index, res in enumerate(cached_data["results"]):
+                emit({"type": "result", "index": index, "result": res})
+        return cached_data
+            
+    if not results:
+        # Fallback: Return empty list but valid JSON
+        return {
+            "query": query,
+            "count": 0,
+            "provider": "none",
+            "results": [],
+            "error": "No results found or all providers failed."
+        }
+
+    # --- Deep Dive Processing ---
+    searched = time.perf_counter()
+    # Hits not already fed page by page are added now (duplicates are skipped)
+    pipeline.add(results)
+    final_results = pipeline.finish()
+    
+    # Output
+    output = {
+        "query": query,
+        "count": len(final_results),
+        "provider": used_provider,
+        "results": final_results
+    }
+    
+    # 2. Save to Cache
+    if use_cache and final_results:
+        stored = output
+        if args.timings:
+            # Timings describe this run only
+            stored = dict(output, results=[{k: v for k, v in res.items() if k != 'timings'} for res in final_results])
+        store_cached_result(cache_key, stored, query, args)
+
+    if args.timings:
+        page_cache = {}
+        for res in pipeline.results:
+            outcome = res.get('timings', {}).get('page_cache')
+            if outcome:
+                page_cache[outcome] = page_cache.get(outcome, 0) + 1
+        output["timings"] = {
+            "total": elapsed_ms(started),
+            "search": round((searched - started) * 1000, 1),
+            "deep_dive": elapsed_ms(searched),
+            "query_cache": ("partial" if partial_results else "miss") if use_cache else "off",
+            "page_cache": page_cache
+        }
+
+    # The cache keeps full pages, so any budget can be served from it later
+    if args.budget:
+        apply_budget(final_results, query, budget_chars(args))
+        pipeline.emit_results(final_results)
+    
+    return output
+
+# --- Server Mode ---
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_ENV = "EVO_SEARCH_SERVER"  # e.g. http://127.0.0.1:8765, makes the CLI a thin client
+CLIENT_ONLY_OPTIONS = ("serve", "server", "batch", "profile")  # Never sent to a server
+
+def option_error(args):
+    """What is wrong with the numeric options in args, or None."""
+    if args.concurrency < 1 or args.batch_concurrency < 1:
+        return "--concurrency and --batch-concurrency must be at least 1"
+    if args.max_bytes < 1:
+        return "--max-bytes must be positive"
+    if args.overfetch < 1:
+        return "--overfetch must be at least 1"
+    if args.budget is not None and args.budget < 1:
+        return "--budget must be positive"
+    return None
+
+def search_options(parser, base, options, fields):
+    """
+    Namespace of base (parsed options) overridden by options, a JSON object
+    sent to the server or read from a batch line, checked the way the
+    command line would be: a string query is one query, other values must
+    convert to their option's type and be among its choices, and flags must
+    be booleans. Raises ValueError on anything else, or on fields not in
+    fields.
+    """
+    if not isinstance(options, dict):
+        raise ValueError("Expected a JSON object")
+    unknown = set(options) - set(fields)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    actions = {action.dest: action for action in parser._actions}
+    values = dict(base)
+    for name, value in options.items():
+        action = actions[name]
+        if name == "query":
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list) or not all(isinstance(word, str) for word in value):
+                raise ValueError("query must be a string or a list of strings")
+        elif value is None and action.default is None:
+            pass
+        elif action.nargs == 0:
+            if not isinstance(value, bool):
+                raise ValueError(f"{name} must be true or false")
+        else:
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise ValueError(f"Invalid {name}: {value!r}")
+            try:
+                converted = (action.type or str)(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid {name}: {value!r}")
+            # 2.5 is not a count, "2" is
+            if isinstance(value, (int, float)) and converted != value:
+                raise ValueError(f"Invalid {name}: {value!r}")
+            if action.choices and converted not in action.choices:
+                raise ValueError(f"Invalid {name}: {value!r} (choose from {', '.join(map(str, action.choices))})")
+            value = converted
+        values[name] = value
+    args = argparse.Namespace(**values)
+    if not "".join(args.query).strip():
+        raise ValueError("Missing query")
+    error = option_error(args)
+    if error:
+        raise ValueError(error)
+    return args
+
+def serve(parser, host=SERVER_HOST, port=SERVER_PORT):
+    """
+    Runs a local JSON endpoint that keeps imports, sessions, connection pools
+    and caches warm between searches.
+    POST /search with the CLI's parsed options as a JSON object (invalid
+    ones get a 400, see search_options), GET /health.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    ctx = SearchContext()
+    defaults = {**vars(parser.parse_args(["placeholder"])), "query": []}
+    fields = [name for name in defaults if name not in CLIENT_ONLY_OPTIONS]
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code, payload):
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _stream(self, args):
+            # NDJSON records as they are produced; the body ends when the connection closes
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            writer = NDJSONWriter(lambda line: self.wfile.write(line.encode('utf-8')), self.wfile.flush)
+            writer(summary_record(run_search(args, ctx, emit=writer)))
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"status": "ok"})
+            else:
+                self._reply(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if self.path != "/search":
+                return self._reply(404, {"error": "Not found"})
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                args = search_options(parser, defaults, json.loads(self.rfile.read(length) or b"{}"), fields)
+            except ValueError as e:
+                return self._reply(400, {"error": f"Invalid search options: {e}"})
+            try:
+                if args.stream:
+                    return self._stream(args)
+                self._reply(200, run_search(args, ctx))
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+
+        def log_message(self, format, *log_args):
+            sys.stderr.write(f"DEBUG: server {self.address_string()} {format % log_args}\n")
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    sys.stderr.write(f"Evo-Search server listening on http://{host}:{port}\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def search_via_server(server_url, args, emit=None):
+    """
+    Thin client: forwards the parsed options to a running server. Returns
+    the output dict (the summary record when streaming, after passing every
+    streamed record to emit), or None if the server is unreachable.
+    """
+    import urllib.error
+    import urllib.request
+
+    options = {k: v for k, v in vars(args).items() if k not in CLIENT_ONLY_OPTIONS}
+    request = urllib.request.Request(
+        server_url.rstrip("/") + "/search",
+        data=json.dumps(options).encode('utf-8'),
+        headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            if not args.stream:
+                return json.loads(response.read())
+            summary = {}
+            for line in response:
+                record = json.loads(line)
+                if record.get("type") == "summary":
+                    summary = record
+                else:
+                    emit(record)
+            return summary
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read() or b'{}') or {"error": str(e)}
+    except (urllib.error.URLError, OSError) as e:
+        sys.stderr.write(f"DEBUG: Server {server_url} unreachable ({e}), searching locally\n")
+        return None
+
+# --- Batch Mode ---
+
+BATCH_FIELDS = ("query", "time", "count", "deep", "provider", "media", "budget", "blend_local", "metadata_only")
+
+def run_batch(parser, source, args):
+    """
+    Runs one search per JSONL line of source (a path, or '-' for stdin) and
+    prints one JSON result per line as each completes. Lines hold a query
+    spec such as {"query": "...", "time": "w", "count": 5, "deep": true,
+    "provider": "ddg"}; missing fields default to the command-line options,
+    and invalid ones fail their line (see search_options).
+    All searches share one context, so provider throttling, per-provider
+    concurrency limits and caches are coordinated across the whole batch.
+    Lines are submitted as they are read, so a search starts without
+    waiting for the rest of the input (e.g. a pipe still being written).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    ctx = SearchContext()
+    emit = NDJSONWriter()
+    # Each line already prints as one record, so per-search streaming is off
+    base = {k: v for k, v in vars(args).items() if k != "batch"}
+    base["stream"] = False
+
+    def run_line(index, line):
+        try:
+            spec = json.loads(line)
+            if isinstance(spec, str):
+                spec = {"query": spec}
+            line_args = search_options(parser, base, spec, BATCH_FIELDS)
+            emit({"index": index, **run_search(line_args, ctx)})
+        except Exception as e:
+            emit({"index": index, "error": str(e)})
+
+    # Reading stays at most one round of searches ahead of them
+    queued = threading.BoundedSemaphore(args.batch_concurrency * 2)
+
+    def run_queued(index, line):
+        try:
+            run_line(index, line)
+        finally:
+            queued.release()
+
+    stream = sys.stdin if source == "-" else open(source, 'r')
+    with stream, ThreadPoolExecutor(max_workers=args.batch_concurrency) as pool:
+        for index, line in enumerate(stream):
+            line = line.strip()
+            if line:
+                queued.acquire()
+                pool.submit(run_queued, index, line)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Evo-Search v3.0")
+    parser.add_argument("query", nargs="*", help="Search query")
+    parser.add_argument("--deep", action="store_true", help="Fetch and parse page content (Deep Dive)")
+    parser.add_argument("--time", "-t", choices=['d', 'w', 'm', 'y'], help="Time filter (day, week, month, year)")
+    parser.add_argument("--count", "-c", type=int, default=5, help="Max results")
+    parser.add_argument("--provider", choices=['ddg', 'google', 'local', 'auto'], default='auto', help="Search provider (default: auto failover; local: offline index of deep-dived pages)")
+    parser.add_argument("--cache", action="store_true", default=True, help="Enable 24h caching (default: True)")
+    parser.add_argument("--no-cache", action="store_false", dest="cache", help="Disable caching")
+    parser.add_argument("--media", action="store_true", help="Extract media (images/videos) in Deep Dive mode")
+    parser.add_argument("--metadata-only", action="store_true", help="With --deep, only read each page's head for date (and --media); no deep_content")
+    parser.add_argument("--fast", action="store_true", help="Parse DDG Lite result pages with regexes instead of BeautifulSoup (falls back to it if they find nothing)")
+    parser.add_argument("--blend-local", action="store_true", help="Interleave hits from the local index of deep-dived pages with the live results")
+    parser.add_argument("--hedge-after", type=float, default=HEDGE_AFTER_SECONDS, metavar="SECONDS", help=f"Auto mode: also query the next provider if the current one has not answered after SECONDS (default: {HEDGE_AFTER_SECONDS}, negative: plain sequential failover)")
+    parser.add_argument("--merge-providers", action="store_true", help="Auto mode: wait for every provider and merge their results")
+    parser.add_argument("--concurrency", type=int, default=DEEP_DIVE_CONCURRENCY, help=f"Parallel deep dive fetches (default: {DEEP_DIVE_CONCURRENCY})")
+    parser.add_argument("--overfetch", type=float, default=OVERFETCH_FACTOR, metavar="FACTOR", help=f"With --time and --deep, request FACTOR times --count results so enough survive the date filter (default: {OVERFETCH_FACTOR})")
+    parser.add_argument("--head-check", action="store_true", help="With --time and --deep, send a HEAD request first and skip pages whose Last-Modified is out of range")
+    parser.add_argument("--budget", type=int, metavar="N", help="Deep Dive: keep only the passages most relevant to the query, N chars (or tokens) of deep_content in total")
+    parser.add_argument("--budget-unit", choices=["chars", "tokens"], default="chars", help=f"Unit of --budget (tokens are estimated as {CHARS_PER_TOKEN} chars)")
+    parser.add_argument("--max-bytes", type=int, default=MAX_PAGE_BYTES, help=f"Max bytes downloaded per page in Deep Dive mode (default: {MAX_PAGE_BYTES})")
+    parser.add_argument("--timings", action="store_true", help="Add per-stage durations (ms) and cache hit/miss counts to the output")
+    parser.add_argument("--profile", metavar="FILE", help="Run locally under cProfile (deep dive workers included) and dump pstats to FILE")
+    parser.add_argument("--stream", action="store_true", help="Print NDJSON records as results complete, then a summary record")
+    parser.add_argument("--batch", metavar="FILE", help="Run one search per JSONL line of FILE ('-' for stdin), printing one JSON result per line")
+    parser.add_argument("--batch-concurrency", type=int, default=BATCH_CONCURRENCY, help=f"Searches running at once in batch mode (default: {BATCH_CONCURRENCY})")
+    parser.add_argument("--serve", nargs="?", const=f"{SERVER_HOST}:{SERVER_PORT}", metavar="HOST:PORT", help=f"Run as a warm local server (default: {SERVER_HOST}:{SERVER_PORT})")
+    parser.add_argument("--server", default=os.environ.get(SERVER_ENV), metavar="URL", help=f"Send the search to a running server (default: ${SERVER_ENV})")
+    return parser
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    error = option_error(args)
+    if error:
+        parser.error(error)
+
+    if args.serve:
+        host, _, port = args.serve.rpartition(":")
+        serve(parser, host or SERVER_HOST, int(port))
+        return
+
+    if args.batch:
+        run_batch(parser, args.batch, args)
+        return
+
+    if not args.query:
+        parser.error("the following arguments are required: query")
+
+    emit = NDJSONWriter() if args.stream else None
+    output = None
+    if args.server and not args.profile:
+        output = search_via_server(args.server, args, emit)
+    if output is None:
+        ctx = SearchContext()
+        if args.profile:
+            ctx.profiler = RunProfiler()
+        output = ctx.call(run_search, args, ctx, emit)
+        if args.profile:
+            ctx.profiler.dump(args.profile)
+            sys.stderr.write(f"Profile written to {args.profile} (python -m pstats {args.profile})\n")
+
+    if emit:
+        emit(summary_record(output))
+    else:
+        print(json.dumps(output, indent=2, ensure_ascii=False, default=str))
+
+if __name__ == "__main__":
+    main()
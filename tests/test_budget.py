@@ -0,0 +1,80 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from evo_search import (PASSAGE_GAP, PASSAGE_MAX_CHARS, PASSAGE_MIN_CHARS, apply_budget, render_passages,
+                        split_passages)
+
+WORDS = "markets officials agreement prices region analysts households delays costs weeks".split()
+
+def paragraph(rng, chars, extra=""):
+    words = []
+    while len(" ".join(words)) < chars:
+        words.append(rng.choice(WORDS))
+    return (" ".join(words) + ". " + extra).strip()
+
+def make_page(seed, paragraphs=8, match=3, chars=400):
+    """Markdown of paragraphs of about chars, only paragraph match mentions the query."""
+    rng = random.Random(seed)
+    blocks = [paragraph(rng, chars, "Starship heat shield tiles" if i == match else "") for i in range(paragraphs)]
+    return "\n\n".join(blocks), blocks[match]
+
+def make_results(count=4):
+    results, best = [], []
+    for seed in range(count):
+        content, match = make_page(seed, match=seed % 8, chars=300 + 150 * seed)
+        results.append({"url": f"https://example.com/{seed}", "deep_content": content})
+        best.append(match)
+    return results, best
+
+def test_split_passages_sizes_and_order():
+    markdown = "# Heading\n\n" + make_page(1, paragraphs=6, chars=900)[0] + "\n\nshort tail"
+    passages = split_passages(markdown)
+    assert passages[0].startswith("# Heading\n\n")
+    assert all(len(p) <= PASSAGE_MAX_CHARS for p in passages)
+    assert all(len(p) >= PASSAGE_MIN_CHARS for p in passages[:-1])
+    assert " ".join(" ".join(passages).split()) == " ".join(markdown.split())
+
+@pytest.mark.parametrize("budget", [1, 10, 60, 200, 500, 1500, 4000, 100000])
+def test_apply_budget_stays_within_budget(budget):
+    results, _ = make_results()
+    apply_budget(results, "starship heat shield", budget)
+    assert sum(len(res["deep_content"]) for res in results) <= budget
+
+def test_apply_budget_keeps_every_best_passage():
+    results, best = make_results()
+    budget = sum(len(match) + 2 * (len(PASSAGE_GAP) + 2) for match in best)
+    apply_budget(results, "starship heat shield", budget)
+    for res, match in zip(results, best):
+        assert match in res["deep_content"]
+        assert res["full_content_chars"] > len(res["deep_content"])
+
+def test_apply_budget_shortens_best_passages_to_fit():
+    results, best = make_results()
+    apply_budget(results, "starship heat shield", 400)
+    for res, match in zip(results, best):
+        kept = res["deep_content"].replace(PASSAGE_GAP, "").strip()
+        assert kept and match.startswith(kept)
+        assert res["deep_content"].endswith(PASSAGE_GAP)
+
+def test_apply_budget_keeps_a_fully_relevant_page_whole():
+    passages = [f"Starship heat shield note {i}." + " x" * 150 for i in range(4)]
+    results = [{"url": "https://example.com/", "deep_content": "\n\n".join(passages)}]
+    apply_budget(results, "starship", 100000)
+    assert results[0]["deep_content"] == "\n\n".join(passages)
+    assert PASSAGE_GAP not in results[0]["deep_content"]
+
+@pytest.mark.parametrize("chosen, texts, expected", [
+    ({0, 1, 2, 3}, None, ["p0", "p1", "p2", "p3"]),
+    ({1, 2}, None, [PASSAGE_GAP, "p1", "p2", PASSAGE_GAP]),
+    ({0, 3}, None, ["p0", PASSAGE_GAP, "p3"]),
+    ({0}, None, ["p0", PASSAGE_GAP]),
+    ({3}, {3: "p"}, [PASSAGE_GAP, "p", PASSAGE_GAP]),
+    (set(), None, []),
+])
+def test_render_passages_gap_placement(chosen, texts, expected):
+    assert render_passages(["p0", "p1", "p2", "p3"], chosen, texts) == "\n\n".join(expected)
@@ -0,0 +1,103 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from evo_search import CACHE_COMPRESS_MIN_BYTES, CACHE_EXPIRE_BATCH, CacheStore, PageCache
+
+def stored(store):
+    """(meta total, actual total, keys) of store's table."""
+    meta = store._conn.execute("SELECT value FROM cache_meta WHERE name = ?", (store.size_key,)).fetchone()[0]
+    total = store._conn.execute(f"SELECT total(size) FROM {store.table}").fetchone()[0]
+    keys = {row[0] for row in store._conn.execute(f"SELECT key FROM {store.table}")}
+    return meta, total, keys
+
+def test_size_total_tracks_put_replace_expire_and_evict(tmp_path):
+    store = CacheStore(str(tmp_path / "cache.sqlite3"), ttl_hours=1, max_bytes=1000)
+    store.put("a", {"text": "x" * 100})
+    store.put("b", {"text": "y" * 200})
+    store.put("a", {"text": "x" * 300})  # Replace
+    meta, total, keys = stored(store)
+    assert meta == total and keys == {"a", "b"}
+
+    store.put("old", {"text": "z" * 50}, created=time.time() - 7200)  # Expired as soon as it is written
+    meta, total, keys = stored(store)
+    assert meta == total and keys == {"a", "b"}
+
+    store.put("c", {"text": "w" * 700})  # Past max_bytes
+    meta, total, keys = stored(store)
+    assert meta == total <= 1000 and "c" in keys
+
+def test_size_total_is_summed_once_for_existing_stores(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    store = CacheStore(path)
+    store.put("a", {"text": "x" * 100})
+    store._conn.execute("DELETE FROM cache_meta")
+    meta, total, _ = stored(CacheStore(path))
+    assert meta == total > 0
+
+def test_page_cache_keeps_its_own_total(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    results, pages = CacheStore(path), PageCache(path)
+    results.put("a", {"text": "x" * 100})
+    pages.put("https://example.com/", {"text": "y" * 300})
+    assert stored(results)[0] == stored(results)[1]
+    assert stored(pages)[0] == stored(pages)[1]
+    assert stored(results)[0] != stored(pages)[0]
+
+def test_evicts_least_recently_used(tmp_path):
+    store = CacheStore(str(tmp_path / "cache.sqlite3"), max_bytes=700)
+    for key in ("a", "b", "c"):
+        store.put(key, {"text": key * 200})
+        time.sleep(0.01)
+    assert store.get("a") is not None  # Now the most recently used
+    time.sleep(0.01)
+    store.put("d", {"text": "d" * 200})
+    _, _, keys = stored(store)
+    assert keys == {"a", "c", "d"}
+
+def test_expired_entries_are_not_served(tmp_path):
+    store = CacheStore(str(tmp_path / "cache.sqlite3"), ttl_hours=1)
+    store.put("a", {"text": "x"})
+    store._conn.execute("UPDATE results SET created = ?", (time.time() - 7200,))
+    assert store.get("a") is None
+
+def test_expiry_sweeps_a_batch_per_write(tmp_path):
+    store = CacheStore(str(tmp_path / "cache.sqlite3"), ttl_hours=1)
+    for i in range(CACHE_EXPIRE_BATCH + 10):
+        store.put(f"k{i}", {"text": "x" * 10})
+    store._conn.execute("UPDATE results SET created = ?", (time.time() - 7200,))
+    store.put("new", {"text": "y"})
+    meta, total, keys = stored(store)
+    assert meta == total and len(keys) == 11
+    store.put("newer", {"text": "z"})
+    meta, total, keys = stored(store)
+    assert meta == total and keys == {"new", "newer"}
+
+def test_large_payloads_round_trip_compressed(tmp_path):
+    store = CacheStore(str(tmp_path / "cache.sqlite3"))
+    data = {"text": "héllo " * CACHE_COMPRESS_MIN_BYTES, "items": [1, 2, 3]}
+    store.put("big", data)
+    store.put("small", {"text": "x"})
+    compressed = dict(store._conn.execute("SELECT key, compressed FROM results"))
+    assert compressed == {"big": 1, "small": 0}
+    size = store._conn.execute("SELECT size FROM results WHERE key = 'big'").fetchone()[0]
+    assert size < len(json.dumps(data))
+    assert store.get("big") == data
+
+def test_import_legacy(tmp_path):
+    legacy = tmp_path / "results_hash.json"
+    legacy.write_text(json.dumps({
+        "fresh": {"timestamp": datetime.now().isoformat(), "data": {"query": "fresh"}},
+        "stale": {"timestamp": datetime.fromtimestamp(time.time() - 48 * 3600).isoformat(), "data": {"query": "stale"}},
+    }))
+    store = CacheStore(str(tmp_path / "cache.sqlite3"), ttl_hours=24)
+    store.import_legacy(str(legacy))
+    assert store.get("fresh") == {"query": "fresh"}
+    assert store.get("stale") is None
+    assert not legacy.exists() and (tmp_path / "results_hash.json.migrated").exists()
+    meta, total, _ = stored(store)
+    assert meta == total
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from evo_search import BATCH_FIELDS, build_parser, search_options
+
+PARSER = build_parser()
+BASE = {**vars(PARSER.parse_args([])), "query": []}
+
+def test_search_options_converts_like_the_command_line():
+    args = search_options(PARSER, BASE, {"query": "x y", "count": "3", "deep": True, "time": None}, BATCH_FIELDS)
+    assert args.query == ["x y"]
+    assert args.count == 3
+    assert args.deep is True
+    assert args.time is None
+    assert args.provider == BASE["provider"]
+
+@pytest.mark.parametrize("options", [
+    {"query": "x", "count": "abc"},
+    {"query": "x", "count": 2.5},
+    {"query": "x", "count": True},
+    {"query": "x", "count": None},
+    {"query": "x", "deep": "yes"},
+    {"query": "x", "time": "q"},
+    {"query": "x", "budget": 0},
+    {"query": "x", "concurrency": 2},
+    {"query": ["x", 1]},
+    {"query": ""},
+    {"count": 3},
+    ["x"],
+])
+def test_search_options_rejects(options):
+    with pytest.raises(ValueError):
+        search_options(PARSER, BASE, options, BATCH_FIELDS)
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from evo_search import canonical_url, normalize_url
+
+@pytest.mark.parametrize("url, expected", [
+    # Search engine redirect wrappers, nested ones included
+    ("//duckduckgo.com/l/?uddg=https%3A%2F%2Fexample.com%2Fa&rut=1", "https://example.com/a"),
+    ("https://www.google.com/url?q=https://example.com/a&sa=U", "https://example.com/a"),
+    ("https://www.google.com/url?q=https%3A%2F%2Fduckduckgo.com%2Fl%2F%3Fuddg%3Dhttps%253A%252F%252Fexample.com%252Fa",
+     "https://example.com/a"),
+    # Tracking parameters and fragments go, the rest keeps its encoding and order
+    ("https://example.com/a?utm_source=x&b=2&fbclid=y&a=%20#top", "https://example.com/a?b=2&a=%20"),
+    # Not a wrapper target: left alone
+    ("https://www.google.com/search?q=test", "https://www.google.com/search?q=test"),
+    ("https://example.com/a?q=javascript:alert(1)", "https://example.com/a?q=javascript:alert(1)"),
+])
+def test_canonical_url(url, expected):
+    assert canonical_url(url) == expected
+
+@pytest.mark.parametrize("url, expected", [
+    ("http://www.Example.com:80/a/?b=2&a=1", "https://example.com/a?a=1&b=2"),
+    ("https://example.com:8443/a", "https://example.com:8443/a"),
+    ("https://example.com/", "https://example.com/"),
+    ("https://example.com/a?utm_medium=social", "https://example.com/a"),
+    # AMP variants of an article fold into it
+    ("https://amp.example.com/2023/10/story", "https://example.com/2023/10/story"),
+    ("https://example.com/2023/10/story/amp/", "https://example.com/2023/10/story"),
+    ("https://example.com/amp/story-slug", "https://example.com/story-slug"),
+    ("https://example.com/news/world-123.amp", "https://example.com/news/world-123"),
+    ("https://example.com/news/world-123.amp.html", "https://example.com/news/world-123.html"),
+    ("https://example.com/story?amp=1&outputType=amp", "https://example.com/story"),
+])
+def test_normalize_url_folds_variants(url, expected):
+    assert normalize_url(url) == expected
+
+@pytest.mark.parametrize("url, expected", [
+    # "amp." / "www." is the whole registrable domain
+    ("https://amp.dev/documentation/", "https://amp.dev/documentation"),
+    ("https://amp.co.uk/x", "https://amp.co.uk/x"),
+    ("https://www.com.au/x", "https://www.com.au/x"),
+    # Sections and tags named "amp" are pages of their own
+    ("https://example.com/tag/amp/", "https://example.com/tag/amp"),
+    ("https://example.com/news/amp", "https://example.com/news/amp"),
+    ("https://example.com/news/amp/story", "https://example.com/news/amp/story"),
+    ("https://example.com/amp", "https://example.com/amp"),
+])
+def test_normalize_url_keeps_distinct_pages(url, expected):
+    assert normalize_url(url) == expected
+
+def test_normalize_url_distinct_pages_get_distinct_keys():
+    urls = ["https://amp.dev/documentation/", "https://dev/documentation",
+            "https://example.com/tag/amp/", "https://example.com/tag",
+            "https://example.com/news/amp", "https://example.com/news"]
+    assert len({normalize_url(url) for url in urls}) == len(urls)